@@ -5,21 +5,34 @@ import logging
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import Platform
 from homeassistant.core import HomeAssistant
-
+import homeassistant.helpers.config_validation as cv
 from homeassistant.helpers.device_registry import DeviceEntry
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+from homeassistant.helpers.typing import ConfigType
 
-# from homeassistant.helpers.typing import ConfigType
-from .const import DOMAIN
-from .coordinator import ClashCoordinator
+from .const import CONF_AGGREGATE, DOMAIN, SIGNAL_RECONCILE
+from .coordinator import AggregateCoordinator, ClashCoordinator
+from .services import async_setup_services
 
 PLATFORMS: list[Platform] = [Platform.SELECT, Platform.SENSOR]
+AGGREGATE_PLATFORMS: list[Platform] = [Platform.SENSOR]
+CONFIG_SCHEMA = cv.config_entry_only_config_schema(DOMAIN)
 _LOGGER = logging.getLogger(__name__)
 
 
+async def async_setup(hass: HomeAssistant, config: ConfigType) -> bool:
+    """Set up the Clash services."""
+    async_setup_services(hass)
+    return True
+
+
 async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry) -> bool:
     """Integretion setup."""
     hass.data.setdefault(DOMAIN, {})
 
+    if config_entry.data.get(CONF_AGGREGATE):
+        return await async_setup_aggregate_entry(hass, config_entry)
+
     # Initialise coordinators
     coordinator = ClashCoordinator(hass, config_entry)
     await coordinator.async_config_entry_first_refresh()
@@ -45,12 +58,28 @@ async def async_setup_entry(hass: HomeAssistant, config_entry: ConfigEntry) -> b
     return True
 
 
+async def async_setup_aggregate_entry(
+    hass: HomeAssistant, config_entry: ConfigEntry
+) -> bool:
+    """Set up the view that polls every controller on one schedule."""
+    coordinator = AggregateCoordinator(hass, config_entry)
+    await coordinator.async_config_entry_first_refresh()
+    hass.data[DOMAIN][config_entry.entry_id] = {
+        "coordinator": coordinator,
+    }
+    await hass.config_entries.async_forward_entry_setups(
+        config_entry, AGGREGATE_PLATFORMS
+    )
+    return True
+
+
 async def options_update_listener(hass: HomeAssistant, config_entry):
     """Handle config options update.
 
-    Reload the integration when the options change.
+    Apply the new entity selection in place, the coordinator and the traffic
+    streams keep running.
     """
-    await hass.config_entries.async_reload(config_entry.entry_id)
+    async_dispatcher_send(hass, SIGNAL_RECONCILE.format(config_entry.entry_id))
 
 
 async def async_remove_config_entry_device(
@@ -72,12 +101,15 @@ async def async_unload_entry(hass: HomeAssistant, config_entry: ConfigEntry) ->
 
     # Unload platforms
     unload_ok = await hass.config_entries.async_unload_platforms(
-        config_entry, PLATFORMS
+        config_entry,
+        AGGREGATE_PLATFORMS if config_entry.data.get(CONF_AGGREGATE) else PLATFORMS,
     )
 
     # Remove the config entry from the hass data object.
     if unload_ok:
-        hass.data[DOMAIN].pop(config_entry.entry_id)
+        coordinator = hass.data[DOMAIN].pop(config_entry.entry_id)["coordinator"]
+        if isinstance(coordinator, AggregateCoordinator):
+            coordinator.async_release()
 
     # Return that unloading was successful.
     return unload_ok
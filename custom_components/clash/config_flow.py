@@ -9,17 +9,24 @@ from typing import Any
 from aiohttp import ClientConnectorError, ClientResponseError
 import voluptuous as vol
 
-from homeassistant.config_entries import ConfigFlow, ConfigFlowResult, OptionsFlow
+from homeassistant.config_entries import (
+    ConfigEntry,
+    ConfigFlow,
+    ConfigFlowResult,
+    OptionsFlow,
+)
 from homeassistant.const import CONF_HOST, CONF_PASSWORD
 from homeassistant.core import HomeAssistant, callback
 from homeassistant.exceptions import HomeAssistantError
 from homeassistant.helpers.aiohttp_client import async_get_clientsession
 import homeassistant.helpers.config_validation as cv
-import homeassistant.helpers.entity_registry as er
 
 from .const import (
+    CONF_AGGREGATE,
     CONF_DELAY,
+    CONF_PATTERN,
     CONF_SELECTOR,
+    CONF_TRACK,
     CONF_TRAFFIC,
     CONF_URLTEST,
     DELAY_TEST,
@@ -83,10 +90,23 @@ def create_entities_schema(proxies, options) -> vol.Schema:
             vol.Optional(
                 CONF_SELECTOR, default=options.get(CONF_SELECTOR)
             ): cv.multi_select(selectors),
+            vol.Optional(
+                CONF_TRACK, default=options.get(CONF_TRACK, [])
+            ): cv.multi_select(urltests + selectors),
+            vol.Optional(
+                CONF_PATTERN, description={"suggested_value": options.get(CONF_PATTERN)}
+            ): valid_pattern,
         }
     )
 
 
+def valid_pattern(value: Any) -> str:
+    """Validate a node name pattern, it is stored as a string."""
+    value = cv.string(value)
+    cv.is_regex(value)
+    return value
+
+
 class ClashConfigFlow(ConfigFlow, domain=DOMAIN):
     """Handle a config flow for Clash Integration."""
 
@@ -104,10 +124,39 @@ class ClashConfigFlow(ConfigFlow, domain=DOMAIN):
         # if you do not want any options for your integration.
         return OptionsFlowHandler()
 
+    @classmethod
+    @callback
+    def async_supports_options_flow(cls, config_entry: ConfigEntry) -> bool:
+        """Return options flow support, the aggregate view has no options."""
+        return not config_entry.data.get(CONF_AGGREGATE)
+
     async def async_step_user(
         self, user_input: dict[str, Any] | None = None
     ) -> ConfigFlowResult:
         """Handle the initial step."""
+        # The aggregate view only makes sense once a controller is configured.
+        if self._async_current_entries(include_ignore=False):
+            return self.async_show_menu(
+                step_id="user", menu_options=["controller", CONF_AGGREGATE]
+            )
+        return await self.async_step_controller()
+
+    async def async_step_aggregate(
+        self, user_input: dict[str, Any] | None = None
+    ) -> ConfigFlowResult:
+        """Handle adding the view combining every controller."""
+        await self.async_set_unique_id(f"Clash - {CONF_AGGREGATE}")
+        self._abort_if_unique_id_configured()
+        if user_input is not None:
+            return self.async_create_entry(
+                title="Clash aggregate", data={CONF_AGGREGATE: True}
+            )
+        return self.async_show_form(step_id=CONF_AGGREGATE)
+
+    async def async_step_controller(
+        self, user_input: dict[str, Any] | None = None
+    ) -> ConfigFlowResult:
+        """Handle adding a controller."""
         # Called when you initiate adding an integration via the UI
         errors: dict[str, str] = {}
 
@@ -143,7 +192,7 @@ class ClashConfigFlow(ConfigFlow, domain=DOMAIN):
 
         # Show initial form.
         return self.async_show_form(
-            step_id="user", data_schema=STEP_USER_DATA_SCHEMA, errors=errors
+            step_id="controller", data_schema=STEP_USER_DATA_SCHEMA, errors=errors
         )
 
     async def async_step_entities(
@@ -174,32 +223,15 @@ class OptionsFlowHandler(OptionsFlow):
         """Handle options flow."""
 
         errors: dict[str, str] = {}
-        # Grab all configured repos from the entity registry so we can populate the
-        # multi-select dropdown that will allow a user to remove a repo.
-        entity_registry = er.async_get(self.hass)
-        entries = er.async_entries_for_config_entry(
-            entity_registry, self.config_entry.entry_id
-        )
 
         proxies = await validate_auth(self.hass, self.config_entry.data)
         ENTITIES_SCHEMA = create_entities_schema(proxies, self.config_entry.options)
 
         if user_input is not None:
-            # Validation was successful, so create a unique id for this instance of your integration and create the config entry.
-            # Remove any unchecked entities.
-            # Store unique_id of selected entities.
-            user_input_entities = []
-            for k, v in user_input.items():
-                user_input_entities.extend([f"{DOMAIN}-{k}-{name}" for name in v])
-            # Store entity_id to be removed.
-            removed_entities_id = [
-                e.entity_id for e in entries if e.unique_id not in user_input_entities
-            ]
-            for entity_id in removed_entities_id:
-                # Unregister from HA
-                entity_registry.async_remove(entity_id)
-
+            # The platforms add and retire entities to match the new options.
             options = self.config_entry.options | user_input
+            if CONF_PATTERN not in user_input:
+                options.pop(CONF_PATTERN, None)
             return self.async_create_entry(title="", data=options)
 
         return self.async_show_form(
@@ -1,5 +1,7 @@
 """Constants."""
 
+from datetime import timedelta
+
 DOMAIN = "clash"
 
 SCAN_INTERVAL = 5
@@ -20,6 +22,63 @@ CONF_DELAY = "delay"
 CONF_URLTEST = "urltest"
 CONF_TRAFFIC = "traffic"
 CONF_SELECTOR = "selector"
+CONF_AGGREGATE = "aggregate"
+CONF_TRACK = "track"
+CONF_PATTERN = "pattern"
+
+# Coordinator context of entities that follow a group down to its egress node.
+CONTEXT_EGRESS = "egress"
+# Coordinator context of entities that read provider data.
+CONTEXT_PROVIDERS = "providers"
+# Coordinator context of entities that read rule hit statistics.
+CONTEXT_RULES = "rule_stats"
+
+PROVIDER_PROXIES = "proxies"
+PROVIDER_RULES = "rules"
+
+# Node sensors are registered disabled by default above this many.
+LARGE_CATALOG = 30
+# Entities constructed and added per event loop iteration during setup.
+ENTITY_BATCH_SIZE = 50
+
+# Time between bulk fetches that reconcile the proxies of the controller.
+CATALOG_INTERVAL = timedelta(seconds=60)
+# Time for the rule hit statistics to lose half their weight.
+RULE_HALF_LIFE = timedelta(hours=1)
+# Rules listed by the rule hit sensor attributes.
+RULE_STATS_TOP = 10
+
+# Dispatcher signal to bring the entities of a config entry in line with the
+# proxies of the controller and the entry options.
+SIGNAL_RECONCILE = "clash_reconcile_{}"
 
 DEFAULT_SCAN_INTERVAL = 60
 MIN_SCAN_INTERVAL = 10
+MODES = ["Direct", "Rule", "Global"]
+
+# Upper bound of concurrent requests sent to one controller.
+PARALLEL_REQUESTS = 4
+# Answers kept by the DNS lookup cache of each controller.
+DNS_CACHE_SIZE = 256
+DNS_QUERY_TYPES = ["A", "AAAA", "CNAME", "HTTPS", "MX", "NS", "PTR", "SRV", "TXT"]
+
+# Seconds the aggregate view waits for one controller before marking it unhealthy.
+AGGREGATE_MEMBER_TIMEOUT = 4
+
+ATTR_CONFIG_ENTRY_ID = "config_entry_id"
+ATTR_GROUPS = "groups"
+ATTR_MODE = "mode"
+ATTR_PROVIDERS = "providers"
+ATTR_HEALTHCHECK = "healthcheck"
+ATTR_DURATION = "duration"
+ATTR_INTERVAL = "interval"
+ATTR_NAMES = "names"
+ATTR_TYPES = "types"
+
+SERVICE_APPLY_PROFILE = "apply_profile"
+SERVICE_UPDATE_PROVIDERS = "update_providers"
+SERVICE_PROFILE = "profile"
+SERVICE_DNS_QUERY = "dns_query"
+
+# hass.data key of the last started profiler.
+DATA_PROFILER = "clash_profiler"
@@ -1,19 +1,42 @@
 """Coordinators."""
 
-from dataclasses import dataclass
+import asyncio
+from collections.abc import Awaitable
+from dataclasses import dataclass, field
 from datetime import timedelta
 import json
 import logging
+import time
+from urllib.parse import quote
 
-from aiohttp import ClientResponseError
+from aiohttp import ClientError, ClientResponseError
 
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import CONF_HOST, CONF_PASSWORD
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.dispatcher import async_dispatcher_send
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
+import homeassistant.util.dt as dt_util
 
-from .const import SCAN_INTERVAL
+from .const import (
+    AGGREGATE_MEMBER_TIMEOUT,
+    CATALOG_INTERVAL,
+    CONTEXT_RULES,
+    DELAY_TEST,
+    DNS_CACHE_SIZE,
+    DOMAIN,
+    PARALLEL_REQUESTS,
+    PROVIDER_PROXIES,
+    PROVIDER_RULES,
+    RULE_HALF_LIFE,
+    RULE_STATS_TOP,
+    SCAN_INTERVAL,
+    SIGNAL_RECONCILE,
+)
+from .dns import DnsCache, summarize
+from .rules import RuleStats
+from .topology import ProxyGraph, latest_delay
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -24,6 +47,9 @@ class ClashData:
 
     clash_mode: str
     proxies: dict[str, dict]
+    proxy_providers: dict[str, dict] = field(default_factory=dict)
+    rule_providers: dict[str, dict] = field(default_factory=dict)
+    rule_stats: dict = field(default_factory=dict)
 
 
 class ClashCoordinator(DataUpdateCoordinator):
@@ -56,8 +82,20 @@ class ClashCoordinator(DataUpdateCoordinator):
             else None
         )
         self.session = async_get_clientsession(hass=self.hass, verify_ssl=False)
-        self.proxies = []
+        self.entry_id = config_entry.entry_id
+        # Last known state of every proxy and group, refreshed by bulk fetches.
+        self.catalog: dict[str, dict] = {}
+        self._catalog_fetched = dt_util.utc_from_timestamp(0)
+        self.topology = ProxyGraph()
         self._mode = None
+        self._request_limit = asyncio.Semaphore(PARALLEL_REQUESTS)
+        self.dns_cache = DnsCache(DNS_CACHE_SIZE)
+        self.rule_stats = RuleStats(RULE_HALF_LIFE, CATALOG_INTERVAL)
+        self._rule_summary: dict = {}
+        # Last known providers, refreshed as rarely as the catalog.
+        self.proxy_providers: dict[str, dict] = {}
+        self.rule_providers: dict[str, dict] = {}
+        self._providers_fetched = dt_util.utc_from_timestamp(0)
 
     async def async_setup(self):
         """Set up the coordinator.
@@ -69,8 +107,14 @@ class ClashCoordinator(DataUpdateCoordinator):
         coordinator.async_config_entry_first_refresh.
         """
         proxies = await self.update_proxy()
-        self.proxies = proxies.keys()
-        self.data = ClashData(clash_mode=(await self.update_mode()), proxies=proxies)
+        self._update_catalog(proxies, full=True)
+        await self.update_providers()
+        self.data = ClashData(
+            clash_mode=(await self.update_mode()),
+            proxies=proxies,
+            proxy_providers=self.proxy_providers,
+            rule_providers=self.rule_providers,
+        )
 
     async def async_update_data(self):
         """Fetch data from API endpoint.
@@ -80,21 +124,82 @@ class ClashCoordinator(DataUpdateCoordinator):
         """
         # What is returned here is stored in self.data by the DataUpdateCoordinator
         listening_entities = set(self.async_contexts())
+        # A periodic bulk fetch notices proxies added to or removed from the
+        # controller, e.g. by a subscription update.
+        stale = dt_util.utcnow() - self._catalog_fetched >= CATALOG_INTERVAL
+        if not listening_entities or stale:
+            return await self.async_fetch_snapshot()
+
+        # Egress sensors resolve their chain from the topology, which the bulk
+        # fetches and the proxies listened to by other entities keep current.
         proxies_to_update = {}
         mode = ""
-        if listening_entities:
-            for name in self.proxies:
-                if name in listening_entities:
-                    proxies_to_update[name] = await self.update_proxy(proxy=name)
-            if 0 in listening_entities:
-                mode = await self.update_mode()
-            # _LOGGER.debug(proxies_to_update)
-            return ClashData(clash_mode=mode, proxies=proxies_to_update)
+        for name in listening_entities:
+            if name in self.catalog:
+                proxies_to_update[name] = await self.update_proxy(proxy=name)
+        if 0 in listening_entities:
+            mode = await self.update_mode()
+        # _LOGGER.debug(proxies_to_update)
+        self._update_catalog(proxies_to_update)
+        return ClashData(
+            clash_mode=mode,
+            proxies=proxies_to_update,
+            proxy_providers=self.proxy_providers,
+            rule_providers=self.rule_providers,
+            rule_stats=(
+                await self.update_rule_stats()
+                if CONTEXT_RULES in listening_entities
+                else {}
+            ),
+        )
+
+    async def async_fetch_snapshot(
+        self, connections: Awaitable[dict] | None = None
+    ) -> ClashData:
+        """Fetch the mode and every proxy with a single proxies request.
 
+        A connections request already in flight is shared with the rule
+        statistics instead of sending another one.
+        """
+        contexts = set(self.async_contexts())
+        # Providers carry every node of their own, so they are only fetched
+        # as often as the catalog.
+        if dt_util.utcnow() - self._providers_fetched >= CATALOG_INTERVAL:
+            await self.update_providers()
+        proxies = await self.update_proxy()
+        if proxies is not None:
+            self._update_catalog(proxies, full=True)
         return ClashData(
-            clash_mode=(await self.update_mode()), proxies=(await self.update_proxy())
+            clash_mode=(await self.update_mode()),
+            proxies=proxies or {},
+            proxy_providers=self.proxy_providers,
+            rule_providers=self.rule_providers,
+            rule_stats=(
+                await self.update_rule_stats(connections)
+                if CONTEXT_RULES in contexts
+                else {}
+            ),
         )
 
+    def _update_catalog(self, proxies: dict[str, dict | None], full=False) -> None:
+        """Merge fetched proxies into the catalog and topology."""
+        proxies = {k: v for k, v in proxies.items() if v is not None}
+        if full:
+            added = proxies.keys() - self.catalog.keys()
+            removed = self.catalog.keys() - proxies.keys()
+            self.topology.remove(removed)
+            self.catalog = proxies
+            self._catalog_fetched = dt_util.utcnow()
+            # The first fetch during setup creates the entities directly.
+            if self.data is not None and (added or removed):
+                _LOGGER.debug("Proxies added: %s, removed: %s", added, removed)
+                # Proxies change with the config, which may change the rules.
+                self.rule_stats.invalidate()
+                async_dispatcher_send(self.hass, SIGNAL_RECONCILE.format(self.entry_id))
+        else:
+            self.catalog.update(proxies)
+        self.topology.update(proxies)
+
     async def update_proxy(self, proxy=None) -> dict[str, dict] | None:
         """Update proxy data."""
         try:
@@ -104,7 +209,7 @@ class ClashCoordinator(DataUpdateCoordinator):
                     headers=self.headers,
                 ) as resp:
                     return json.loads(await resp.text())["proxies"]
-            if proxy in self.proxies:
+            if proxy in self.catalog:
                 async with self.session.get(
                     f"http://{self.host}/proxies/{proxy}",
                     headers=self.headers,
@@ -114,6 +219,118 @@ class ClashCoordinator(DataUpdateCoordinator):
             _LOGGER.error("Proxy update error: %s", e)
             return None
 
+    async def update_providers(self) -> tuple[dict[str, dict], dict[str, dict]]:
+        """Update proxy and rule provider data.
+
+        A failed request keeps the providers last known of its kind.
+        """
+
+        async def fetch(kind: str) -> dict[str, dict] | None:
+            try:
+                async with self.session.get(
+                    f"http://{self.host}/providers/{kind}",
+                    headers=self.headers,
+                ) as resp:
+                    resp.raise_for_status()
+                    providers = json.loads(await resp.text())["providers"]
+            except ClientResponseError as e:
+                _LOGGER.debug("Provider %s update error: %s", kind, e)
+                return None
+            # Inline proxies of the config are served as a "Compatible" provider.
+            return {
+                name: provider
+                for name, provider in providers.items()
+                if provider.get("vehicleType") != "Compatible"
+            }
+
+        proxy_providers, rule_providers = await asyncio.gather(
+            fetch(PROVIDER_PROXIES), fetch(PROVIDER_RULES)
+        )
+        if proxy_providers is None:
+            proxy_providers = self.proxy_providers
+        if rule_providers is None:
+            rule_providers = self.rule_providers
+        # Sensors exist per provider, usage sensors for subscriptions only.
+        changed = rule_providers.keys() != self.rule_providers.keys() or {
+            name: bool(provider.get("subscriptionInfo"))
+            for name, provider in proxy_providers.items()
+        } != {
+            name: bool(provider.get("subscriptionInfo"))
+            for name, provider in self.proxy_providers.items()
+        }
+        self.proxy_providers, self.rule_providers = proxy_providers, rule_providers
+        self._providers_fetched = dt_util.utcnow()
+        if self.data is not None and changed:
+            _LOGGER.debug("Providers changed")
+            async_dispatcher_send(self.hass, SIGNAL_RECONCILE.format(self.entry_id))
+        return proxy_providers, rule_providers
+
+    async def provider_action(self, kind: str, name: str, healthcheck=False) -> float:
+        """Update or health check a provider, return the elapsed seconds."""
+        url = f"http://{self.host}/providers/{kind}/{quote(name, safe='')}"
+        async with self._request_limit:
+            start = time.monotonic()
+            if healthcheck:
+                request = self.session.get(f"{url}/healthcheck", headers=self.headers)
+            else:
+                request = self.session.put(url, headers=self.headers)
+            async with request as resp:
+                resp.raise_for_status()
+            return time.monotonic() - start
+
+    async def query_dns(self, name: str, qtype: str) -> dict:
+        """Resolve a name the way the controller does, cached for the record TTL."""
+        if (result := self.dns_cache.get(name, qtype)) is not None:
+            return result | {"cached": True}
+        async with (
+            self._request_limit,
+            self.session.get(
+                f"http://{self.host}/dns/query",
+                headers=self.headers,
+                params={"name": name, "type": qtype},
+            ) as resp,
+        ):
+            resp.raise_for_status()
+            result = summarize(json.loads(await resp.text()))
+        self.dns_cache.put(name, qtype, result)
+        return result | {"cached": False}
+
+    async def update_rule_stats(
+        self, connections: Awaitable[dict] | None = None
+    ) -> dict:
+        """Attribute the live connections to rules, loading the rules if needed.
+
+        The statistics are optional, errors keep the last summary instead of
+        failing the update of every entity.
+        """
+        try:
+            if self.rule_stats.stale:
+                async with self.session.get(
+                    f"http://{self.host}/rules",
+                    headers=self.headers,
+                ) as resp:
+                    resp.raise_for_status()
+                    self.rule_stats.load(json.loads(await resp.text())["rules"])
+            if connections is None:
+                connections = self.update_connections()
+            self.rule_stats.attribute((await connections).get("connections") or [])
+        except ClientResponseError as e:
+            _LOGGER.debug("Rule statistics update error: %s", e)
+        except (KeyError, TypeError, ValueError) as e:
+            _LOGGER.debug("Malformed rules or connections: %r", e)
+        else:
+            self._rule_summary = self.rule_stats.summary(RULE_STATS_TOP)
+        return self._rule_summary
+
+    async def update_connections(self) -> dict:
+        """Update connections and traffic totals."""
+        async with self.session.get(
+            f"http://{self.host}/connections",
+            headers=self.headers,
+        ) as resp:
+            resp.raise_for_status()
+            return json.loads(await resp.text())
+
     async def update_mode(self) -> str:
         """Update config data."""
         async with self.session.get(
@@ -125,17 +342,209 @@ class ClashCoordinator(DataUpdateCoordinator):
         return self._mode
 
     async def select_selector(self, proxy, option) -> None:
-        """Select clash mode."""
-        await self.session.put(
-            f"http://{self.host}/proxies/{proxy}",
-            headers=self.headers,
-            data=f'{{"name": "{option}"}}',
-        )
+        """Select selector option."""
+        async with (
+            self._request_limit,
+            self.session.put(
+                f"http://{self.host}/proxies/{proxy}",
+                headers=self.headers,
+                json={"name": option},
+            ) as resp,
+        ):
+            resp.raise_for_status()
 
     async def select_mode(self, option) -> None:
         """Select clash mode."""
-        await self.session.patch(
-            f"http://{self.host}/configs",
-            headers=self.headers,
-            data=f'{{"mode": "{option}"}}',
+        async with (
+            self._request_limit,
+            self.session.patch(
+                f"http://{self.host}/configs",
+                headers=self.headers,
+                json={"mode": option},
+            ) as resp,
+        ):
+            resp.raise_for_status()
+
+
+@dataclass
+class MemberStatus:
+    """Health and throughput of one controller in the aggregate view."""
+
+    host: str
+    healthy: bool
+    latency: float | None = None
+    error: str | None = None
+    up: float | None = None
+    down: float | None = None
+
+
+@dataclass
+class AggregateData:
+    """Combined state of every configured controller."""
+
+    members: dict[str, MemberStatus]
+    up: float
+    down: float
+    fastest: str | None = None
+    fastest_delays: dict[str, int] = field(default_factory=dict)
+
+
+class AggregateCoordinator(DataUpdateCoordinator):
+    """Poll every controller concurrently on one shared schedule."""
+
+    data: AggregateData
+
+    def __init__(self, hass: HomeAssistant, config_entry: ConfigEntry) -> None:
+        """Initialize."""
+
+        super().__init__(
+            hass,
+            _LOGGER,
+            name="Clash aggregate coordinator",
+            update_method=self.async_update_data,
+            update_interval=timedelta(seconds=SCAN_INTERVAL),
+        )
+        self.config_entry = config_entry
+        # Controller coordinators whose own schedule is suspended.
+        self._claimed: set[ClashCoordinator] = set()
+        # Last traffic totals per controller, (monotonic time, upload, download).
+        self._totals: dict[str, tuple[float, int, int]] = {}
+
+    @callback
+    def members(self) -> dict[str, ClashCoordinator]:
+        """Return the coordinators of the loaded controller entries."""
+        return {
+            entry_id: entry_data["coordinator"]
+            for entry_id, entry_data in self.hass.data.get(DOMAIN, {}).items()
+            if isinstance(entry_data.get("coordinator"), ClashCoordinator)
+        }
+
+    @callback
+    def async_release(self) -> None:
+        """Hand polling back to the controller coordinators."""
+        for coordinator in self._claimed:
+            coordinator.update_interval = timedelta(seconds=SCAN_INTERVAL)
+            self.hass.async_create_task(coordinator.async_request_refresh())
+        self._claimed.clear()
+
+    async def async_update_data(self) -> AggregateData:
+        """Poll all controllers at once."""
+        members = self.members()
+        for coordinator in members.values():
+            if coordinator not in self._claimed:
+                # The shared schedule replaces the controller's own polling.
+                coordinator.update_interval = None
+                self._claimed.add(coordinator)
+        self._claimed.intersection_update(members.values())
+        self._totals = {k: v for k, v in self._totals.items() if k in members}
+
+        results = await asyncio.gather(
+            *(
+                self._async_poll(entry_id, coordinator)
+                for entry_id, coordinator in members.items()
+            ),
+            return_exceptions=True,
+        )
+        statuses: dict[str, MemberStatus] = {}
+        for (entry_id, coordinator), result in zip(
+            members.items(), results, strict=True
+        ):
+            if isinstance(result, BaseException):
+                if not isinstance(result, Exception):
+                    raise result
+                # An unexpected error of one controller never fails the view.
+                _LOGGER.warning(
+                    "Aggregate poll of %s failed: %r", coordinator.host, result
+                )
+                coordinator.async_set_update_error(result)
+                result = MemberStatus(
+                    host=coordinator.host,
+                    healthy=False,
+                    error=str(result) or type(result).__name__,
+                )
+            statuses[entry_id] = result
+        fastest, fastest_delays = self._fastest_shared_node(
+            [members[k] for k, status in statuses.items() if status.healthy]
+        )
+        return AggregateData(
+            members=statuses,
+            up=sum(status.up or 0 for status in statuses.values()),
+            down=sum(status.down or 0 for status in statuses.values()),
+            fastest=fastest,
+            fastest_delays=fastest_delays,
+        )
+
+    async def _async_poll(
+        self, entry_id: str, coordinator: ClashCoordinator
+    ) -> MemberStatus:
+        """Poll one controller and push its data as soon as it arrives."""
+        start = time.monotonic()
+        pending: asyncio.Future[dict] | None = None
+        try:
+            async with asyncio.timeout(AGGREGATE_MEMBER_TIMEOUT):
+                # One connections request serves the totals and the rules.
+                pending = asyncio.ensure_future(coordinator.update_connections())
+                data = await coordinator.async_fetch_snapshot(pending)
+                connections = await pending
+            upload = int(connections["uploadTotal"])
+            download = int(connections["downloadTotal"])
+        except (ClientError, TimeoutError, KeyError, TypeError, ValueError) as err:
+            _LOGGER.debug("Aggregate poll of %s failed: %s", coordinator.host, err)
+            coordinator.async_set_update_error(err)
+            return MemberStatus(
+                host=coordinator.host,
+                healthy=False,
+                latency=round((time.monotonic() - start) * 1000),
+                error=str(err) or type(err).__name__,
+            )
+        finally:
+            if pending is not None:
+                # A failed snapshot leaves the shared request unawaited.
+                pending.cancel()
+                if pending.done() and not pending.cancelled():
+                    pending.exception()
+        now = time.monotonic()
+        # A slow controller never holds back the entities of the others.
+        coordinator.async_set_updated_data(data)
+
+        status = MemberStatus(
+            host=coordinator.host,
+            healthy=True,
+            latency=round((now - start) * 1000),
+        )
+        if (last := self._totals.get(entry_id)) is not None:
+            elapsed = now - last[0]
+            # Totals restart from zero when the controller restarts.
+            if elapsed > 0 and upload >= last[1] and download >= last[2]:
+                status.up = (upload - last[1]) / elapsed / 1024
+                status.down = (download - last[2]) / elapsed / 1024
+        self._totals[entry_id] = (now, upload, download)
+        return status
+
+    @staticmethod
+    def _fastest_shared_node(
+        coordinators: list[ClashCoordinator],
+    ) -> tuple[str | None, dict[str, int]]:
+        """Return the node with the best worst-case delay on every controller."""
+        if not coordinators:
+            return None, {}
+        shared = None
+        for coordinator in coordinators:
+            nodes = {
+                name
+                for name, proxy in coordinator.catalog.items()
+                if proxy["type"] in DELAY_TEST and latest_delay(proxy)
+            }
+            shared = nodes if shared is None else shared & nodes
+        if not shared:
+            return None, {}
+        fastest = min(
+            sorted(shared),
+            key=lambda name: max(
+                latest_delay(coordinator.catalog[name]) for coordinator in coordinators
+            ),
         )
+        return fastest, {
+            coordinator.host: latest_delay(coordinator.catalog[fastest])
+            for coordinator in coordinators
+        }
@@ -0,0 +1,45 @@
+"""Diagnostics support for Clash."""
+
+from typing import Any
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_PASSWORD
+from homeassistant.core import HomeAssistant
+
+from .const import DATA_PROFILER, DOMAIN
+from .coordinator import ClashCoordinator
+from .profiler import ClashProfiler
+
+TO_REDACT = {CONF_PASSWORD}
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, config_entry: ConfigEntry
+) -> dict[str, Any]:
+    """Return diagnostics for a config entry."""
+    coordinator = hass.data[DOMAIN][config_entry.entry_id]["coordinator"]
+    diagnostics: dict[str, Any] = {
+        "entry": {
+            "data": async_redact_data(dict(config_entry.data), TO_REDACT),
+            "options": dict(config_entry.options),
+        },
+        "coordinator": {
+            "last_update_success": coordinator.last_update_success,
+            "update_interval": str(coordinator.update_interval),
+            "listening_contexts": [
+                str(context) for context in coordinator.async_contexts()
+            ],
+        },
+    }
+    if isinstance(coordinator, ClashCoordinator):
+        diagnostics["coordinator"]["catalog_size"] = len(coordinator.catalog)
+        # Every rule, unlike the sensor attributes.
+        diagnostics["rule_stats"] = coordinator.rule_stats.summary()
+
+    profiler: ClashProfiler | None = hass.data.get(DATA_PROFILER)
+    diagnostics["profile"] = {
+        "running": profiler is not None and profiler.running,
+        "report": None if profiler is None else profiler.report,
+    }
+    return diagnostics
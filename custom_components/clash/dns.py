@@ -0,0 +1,91 @@
+"""DNS answers resolved through the controller."""
+
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from ipaddress import ip_address, ip_network
+
+import homeassistant.util.dt as dt_util
+
+# Default fake-ip-range of the Clash cores, within the 198.18.0.0/15 benchmark block.
+FAKE_IP_NETWORK = ip_network("198.18.0.0/15")
+# Seconds an answer without records is cached when it carries no SOA minimum.
+NEGATIVE_TTL = 30
+# Response codes worth caching, NOERROR and NXDOMAIN. Others such as SERVFAIL
+# and REFUSED are transient upstream failures.
+CACHED_STATUS = (0, 3)
+
+
+def summarize(response: dict) -> dict:
+    """Reduce a /dns/query response to its answers and their lowest TTL."""
+    status = response.get("Status", 0)
+    answers = [
+        {
+            "name": record["name"],
+            "type": record["type"],
+            "ttl": record["TTL"],
+            "data": record["data"],
+        }
+        for record in response.get("Answer") or ()
+    ]
+    if status not in CACHED_STATUS:
+        ttl = 0
+    elif answers:
+        ttl = min(answer["ttl"] for answer in answers)
+    else:
+        # RFC 2308, negative answers are cached for the TTL of their SOA record.
+        ttl = min(
+            (record["TTL"] for record in response.get("Authority") or ()),
+            default=NEGATIVE_TTL,
+        )
+    return {
+        "status": status,
+        "answers": answers,
+        "fake_ip": any(_is_fake_ip(answer["data"]) for answer in answers),
+        "ttl": ttl,
+    }
+
+
+def _is_fake_ip(data: str) -> bool:
+    try:
+        return ip_address(data) in FAKE_IP_NETWORK
+    except ValueError:
+        return False
+
+
+class DnsCache:
+    """Least recently used DNS answers, expired by their record TTL."""
+
+    def __init__(self, size: int) -> None:
+        """Initialize."""
+        self.size = size
+        self._entries: OrderedDict[tuple[str, str], tuple[datetime, dict]] = (
+            OrderedDict()
+        )
+
+    def get(self, name: str, qtype: str) -> dict | None:
+        """Return a cached answer with its remaining TTL, if still valid."""
+        key = (name, qtype)
+        if (entry := self._entries.get(key)) is None:
+            return None
+        expires, result = entry
+        remaining = (expires - dt_util.utcnow()).total_seconds()
+        if remaining <= 0:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return result | {"ttl": int(remaining)}
+
+    def put(self, name: str, qtype: str, result: dict) -> None:
+        """Cache an answer for its TTL."""
+        if result["ttl"] <= 0:
+            return
+        key = (name, qtype)
+        expires = dt_util.utcnow() + timedelta(seconds=result["ttl"])
+        self._entries[key] = (expires, result)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        """Return the number of cached answers, expired ones included."""
+        return len(self._entries)
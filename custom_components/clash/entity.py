@@ -0,0 +1,187 @@
+"""Clash entity helpers."""
+
+from abc import ABC, abstractmethod
+import asyncio
+from collections.abc import Callable, Hashable, Iterable, Mapping
+import logging
+import re
+from typing import Any
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers import entity_registry as er
+from homeassistant.helpers.device_registry import DeviceInfo
+from homeassistant.helpers.entity import Entity
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
+
+from .const import (
+    CONF_DELAY,
+    CONF_PATTERN,
+    CONF_TRACK,
+    DELAY_TEST,
+    DOMAIN,
+    ENTITY_BATCH_SIZE,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+async def async_add_entities_batched(
+    async_add_entities: AddEntitiesCallback, entities: Iterable[Entity]
+) -> None:
+    """Add entities in batches, yielding to the event loop in between.
+
+    Entities are constructed as the iterable is consumed, so large selections
+    do not block the loop for their whole setup.
+    """
+    batch: list[Entity] = []
+    for entity in entities:
+        batch.append(entity)
+        if len(batch) >= ENTITY_BATCH_SIZE:
+            async_add_entities(batch)
+            batch = []
+            await asyncio.sleep(0)
+    if batch:
+        async_add_entities(batch)
+
+
+def selected_nodes(catalog: dict[str, dict], options: Mapping[str, Any]) -> list[str]:
+    """Return the nodes to create delay sensors for.
+
+    These are the nodes selected by name, the members of the tracked groups and
+    the nodes matching the name pattern.
+    """
+    nodes = dict.fromkeys(options.get(CONF_DELAY, []))
+    for group in options.get(CONF_TRACK, []):
+        nodes.update(dict.fromkeys(catalog.get(group, {}).get("all", [])))
+    if pattern := options.get(CONF_PATTERN):
+        nodes.update(dict.fromkeys(n for n in catalog if re.search(pattern, n)))
+    explicit = set(options.get(CONF_DELAY, []))
+    return [
+        name
+        for name in nodes
+        if name in explicit or (name in catalog and catalog[name]["type"] in DELAY_TEST)
+    ]
+
+
+class EntityReconciler:
+    """Keep the entities of a platform in line with a wanted set.
+
+    Entities are keyed by what they show, e.g. ("delay", node). Missing
+    entities are created and entities no longer wanted are retired from the
+    entity registry, the others are left running untouched.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        domain: str,
+        async_add_entities: AddEntitiesCallback,
+    ) -> None:
+        """Initialize."""
+        self.hass = hass
+        self.domain = domain
+        self.async_add_entities = async_add_entities
+        self.entities: dict[Hashable, Entity] = {}
+        self._lock = asyncio.Lock()
+
+    async def async_reconcile(
+        self, wanted: Mapping[Hashable, Callable[[], Entity]]
+    ) -> None:
+        """Add and retire entities, the factories build the missing ones."""
+        async with self._lock:
+            entity_registry = er.async_get(self.hass)
+            for key in self.entities.keys() - wanted.keys():
+                entity = self.entities.pop(key)
+                _LOGGER.info("Retiring %s entity %s", self.domain, key)
+                if entity_id := entity_registry.async_get_entity_id(
+                    self.domain, DOMAIN, entity.unique_id
+                ):
+                    # Removing the registry entry removes a running entity too.
+                    entity_registry.async_remove(entity_id)
+                elif entity.hass is not None:
+                    await entity.async_remove()
+
+            def build() -> Iterable[Entity]:
+                for key, factory in wanted.items():
+                    if key not in self.entities:
+                        self.entities[key] = entity = factory()
+                        yield entity
+
+            await async_add_entities_batched(self.async_add_entities, build())
+
+
+class ClashEntity(CoordinatorEntity):
+    """Entity of one controller, grouped under the controller device.
+
+    Subclasses fix their name and unique id at construction, and write their
+    state with _async_write_if_changed, only when it or the availability
+    changed.
+    """
+
+    def __init__(self, coordinator, context: Any = None) -> None:
+        """Initialize."""
+        super().__init__(coordinator, context=context)
+        self.host = coordinator.host
+        self._attr_device_info = DeviceInfo(
+            identifiers={
+                # Serial numbers are unique identifiers within a specific domain
+                (DOMAIN, self.host)
+            },
+            configuration_url=f"http://{self.host}/ui",
+        )
+        self._written_available: bool | None = None
+
+    async def async_added_to_hass(self) -> None:
+        """Remember the availability written when added."""
+        await super().async_added_to_hass()
+        self._written_available = self.available
+
+    @callback
+    def _async_write_if_changed(self, changed: bool) -> None:
+        """Write the state if it or the availability changed."""
+        available = self.available
+        if changed or available != self._written_available:
+            self._written_available = available
+            self.async_write_ha_state()
+
+
+class ProxyEntity(ClashEntity, ABC):
+    """Entity following one proxy or group of the controller.
+
+    State and attributes are computed when the proxy changes.
+    """
+
+    _suffix: str
+
+    def __init__(self, coordinator, name) -> None:
+        """Initialize."""
+        super().__init__(coordinator, context=name)
+        self.name_id = name
+        self._attr_name = f"{name} {self._suffix}"
+        # All entities must have a unique id.  Think carefully what you want this to be as
+        # changing it later will cause HA to create new entities.
+        self._attr_unique_id = f"{DOMAIN}-{self.host}-{self._attr_name}"
+        # The proxy may be gone from the controller since it was selected.
+        self._proxy = coordinator.catalog.get(name, {})
+        self._update_from_proxy()
+
+    @abstractmethod
+    @callback
+    def _update_from_proxy(self) -> None:
+        """Compute the state and attributes from the proxy."""
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Update the entity with latest data from coordinator."""
+        proxy = self.coordinator.data.proxies.get(self.name_id)
+        changed = proxy is not None and proxy != self._proxy
+        if changed:
+            self._proxy = proxy
+            self._update_from_proxy()
+        self._async_write_if_changed(changed)
+
+    @property
+    def available(self) -> bool:
+        """Return if the proxy still exists on the controller."""
+        return super().available and self.name_id in self.coordinator.catalog
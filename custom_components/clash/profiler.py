@@ -0,0 +1,199 @@
+"""Opt-in profiler of the integration hot paths."""
+
+from collections import Counter, defaultdict
+from collections.abc import Callable
+from datetime import datetime
+import functools
+import inspect
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Any
+
+from homeassistant.core import HomeAssistant, callback
+import homeassistant.util.dt as dt_util
+
+_LOGGER = logging.getLogger(__name__)
+
+_PACKAGE_DIR = os.path.dirname(__file__)
+# Entries of the per-function summary kept in the report.
+TOP_FUNCTIONS = 50
+
+
+def _targets() -> list[tuple[type, str]]:
+    """Return the methods timed while profiling."""
+    # Imported here, the platforms are loaded after the services.
+    from . import select, sensor
+    from .coordinator import AggregateCoordinator, ClashCoordinator
+
+    entities = [
+        select.ClashSelector,
+        select.ClashMode,
+        sensor.URLTestSensor,
+        sensor.EgressSensor,
+        sensor.DelaySensor,
+        sensor.ProviderSensor,
+        sensor.TrafficSensor,
+        sensor.AggregateSensor,
+    ]
+    targets = []
+    for coordinator in (ClashCoordinator, AggregateCoordinator):
+        targets.append((coordinator, "_async_update_data"))
+        # Fan-out to the _handle_coordinator_update of every listening entity.
+        targets.append((coordinator, "async_update_listeners"))
+    targets.append((ClashCoordinator, "async_fetch_snapshot"))
+    targets.append((ClashCoordinator, "update_proxy"))
+    targets.append((sensor.TrafficSensor, "_handle_message"))
+    for entity in entities:
+        # Every state write goes through here, including property evaluation.
+        targets.append((entity, "_async_write_ha_state"))
+    return targets
+
+
+class ClashProfiler:
+    """Sample the event loop and time the integration hot paths.
+
+    Nothing is installed while the profiler is stopped: the timed methods are
+    wrapped on start and restored on stop, and the sampling thread only runs
+    in between.
+    """
+
+    def __init__(self, hass: HomeAssistant, interval: float) -> None:
+        """Initialize."""
+        self.hass = hass
+        self.interval = interval
+        self.started: datetime | None = None
+        self.report: dict[str, Any] | None = None
+        self._stacks: Counter[tuple[str, ...]] = Counter()
+        self._sections: defaultdict[str, list[float]] = defaultdict(list)
+        self._originals: list[tuple[type, str, Any]] = []
+        self._stop_event = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def running(self) -> bool:
+        """Return if the profiler is sampling."""
+        return self._thread is not None
+
+    @callback
+    def async_start(self) -> None:
+        """Start sampling from the event loop."""
+        self.started = dt_util.utcnow()
+        self._stacks.clear()
+        self._sections.clear()
+        for owner, name in _targets():
+            if (func := getattr(owner, name, None)) is None:
+                continue
+            self._originals.append((owner, name, owner.__dict__.get(name)))
+            setattr(owner, name, self._wrap(f"{owner.__name__}.{name}", func))
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._sample,
+            args=(threading.get_ident(),),
+            name="clash_profiler",
+            daemon=True,
+        )
+        self._thread.start()
+        _LOGGER.info("Profiling started, sampling every %s seconds", self.interval)
+
+    @callback
+    def async_stop(self) -> dict[str, Any]:
+        """Stop sampling and build the report."""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        for owner, name, original in reversed(self._originals):
+            if original is None:
+                delattr(owner, name)
+            else:
+                setattr(owner, name, original)
+        self._originals.clear()
+        self.report = self._build_report()
+        _LOGGER.info("Profiling stopped after %s samples", self.report["samples"])
+        return self.report
+
+    def _wrap(self, section: str, func: Callable) -> Callable:
+        """Return func recording its wall time, awaits included."""
+        timings = self._sections[section]
+
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    timings.append(time.perf_counter() - start)
+
+            return async_timed
+
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                timings.append(time.perf_counter() - start)
+
+        return timed
+
+    def _sample(self, loop_thread_id: int) -> None:
+        """Record the event loop stack whenever it runs integration code."""
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(loop_thread_id)  # noqa: SLF001
+            stack = []
+            ours = False
+            while frame is not None:
+                code = frame.f_code
+                ours = ours or code.co_filename.startswith(_PACKAGE_DIR)
+                module = frame.f_globals.get("__name__", "?")
+                stack.append(f"{module}:{code.co_name}")
+                frame = frame.f_back
+            if ours:
+                self._stacks[tuple(reversed(stack))] += 1
+
+    def _build_report(self) -> dict[str, Any]:
+        """Summarize the samples and section timings."""
+        own: Counter[str] = Counter()
+        total: Counter[str] = Counter()
+        for stack, count in self._stacks.items():
+            own[stack[-1]] += count
+            for function in set(stack):
+                total[function] += count
+        samples = sum(self._stacks.values())
+        return {
+            "started": self.started.isoformat() if self.started else None,
+            "duration": (dt_util.utcnow() - self.started).total_seconds()
+            if self.started
+            else None,
+            "interval_ms": self.interval * 1000,
+            "samples": samples,
+            "sections": {
+                section: {
+                    "calls": len(timings),
+                    "total_ms": round(sum(timings) * 1000, 3),
+                    "mean_ms": round(sum(timings) / len(timings) * 1000, 3),
+                    "max_ms": round(max(timings) * 1000, 3),
+                }
+                for section, timings in sorted(self._sections.items())
+                if timings
+            },
+            "functions": [
+                {
+                    "function": function,
+                    "self_samples": own[function],
+                    "total_samples": count,
+                    "total_percent": round(count / samples * 100, 2),
+                }
+                for function, count in total.most_common(TOP_FUNCTIONS)
+            ],
+            # Collapsed stacks, the input format of flamegraph.pl and speedscope.
+            "collapsed": [
+                f"{';'.join(stack)} {count}"
+                for stack, count in self._stacks.most_common()
+            ],
+        }
@@ -0,0 +1,161 @@
+"""Rule hit statistics."""
+
+from collections.abc import Iterable
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Any
+
+import homeassistant.util.dt as dt_util
+
+# Rule type matching the rules of a rule provider, its payload is the provider.
+RULE_SET = "RuleSet"
+
+
+@dataclass
+class RuleCounter:
+    """Exponentially decayed hits and bytes of a rule or rule provider."""
+
+    hits: float = 0.0
+    bytes: float = 0.0
+    total_hits: int = 0
+    total_bytes: int = 0
+    updated: datetime | None = None
+
+    def decayed(self, now: datetime, half_life: timedelta) -> tuple[float, float]:
+        """Return the hits and bytes decayed to now."""
+        if self.updated is None:
+            return 0.0, 0.0
+        factor = 0.5 ** ((now - self.updated) / half_life)
+        return self.hits * factor, self.bytes * factor
+
+    def add(self, now: datetime, half_life: timedelta, hits: int, size: int) -> None:
+        """Decay to now, then count new hits and bytes."""
+        self.hits, self.bytes = self.decayed(now, half_life)
+        self.hits += hits
+        self.bytes += size
+        self.total_hits += hits
+        self.total_bytes += size
+        self.updated = now
+
+
+class RuleStats:
+    """Attribute connections to the rule that matched them.
+
+    The rules are loaded once and kept until the controller config changes.
+    Connections are followed by id, so every poll only counts the hits of new
+    connections and the bytes transferred since the previous poll.
+    """
+
+    def __init__(self, half_life: timedelta, reload_interval: timedelta) -> None:
+        """Initialize."""
+        self.half_life = half_life
+        self.reload_interval = reload_interval
+        self.rules: list[dict] | None = None
+        self._loaded = dt_util.utc_from_timestamp(0)
+        self._unknown = False
+        # Counters by rule type and payload, kept across rule reloads.
+        self._rules: dict[tuple[str, str], RuleCounter] = {}
+        self._providers: dict[str, RuleCounter] = {}
+        # Connection id to its rule and the bytes already counted.
+        self._connections: dict[str, tuple[tuple[str, str], int]] = {}
+
+    @property
+    def stale(self) -> bool:
+        """Return if the rules have to be loaded again."""
+        if self.rules is None:
+            return True
+        # Connections matched by unknown rules mean the config was reloaded,
+        # checked with a delay so a core naming rules differently cannot loop.
+        return self._unknown and dt_util.utcnow() - self._loaded >= self.reload_interval
+
+    def invalidate(self) -> None:
+        """Load the rules again on the next update."""
+        self.rules = None
+
+    def load(self, rules: list[dict]) -> None:
+        """Index the rules of the controller."""
+        # Ordered like the config, where the first matching rule wins.
+        keys = dict.fromkeys((rule["type"], rule["payload"]) for rule in rules)
+        self.rules = rules
+        self._loaded = dt_util.utcnow()
+        self._unknown = False
+        self._rules = {key: self._rules.get(key) or RuleCounter() for key in keys}
+        self._providers = {
+            payload: self._providers.get(payload) or RuleCounter()
+            for rule_type, payload in keys
+            if rule_type == RULE_SET
+        }
+
+    def attribute(self, connections: list[dict]) -> None:
+        """Count the hits and bytes of the live connections.
+
+        A malformed connection raises before any counter changes.
+        """
+        now = dt_util.utcnow()
+        live = {}
+        counts = []
+        unknown = False
+        for connection in connections:
+            key = (connection.get("rule", ""), connection.get("rulePayload", ""))
+            if key not in self._rules:
+                unknown = True
+                continue
+            size = connection.get("upload", 0) + connection.get("download", 0)
+            previous = self._connections.get(connection["id"])
+            hits = 0 if previous else 1
+            delta = max(size - previous[1], 0) if previous else size
+            live[connection["id"]] = (key, size)
+            if hits or delta:
+                counts.append((key, hits, delta))
+        for key, hits, delta in counts:
+            self._rules[key].add(now, self.half_life, hits, delta)
+            if key[0] == RULE_SET:
+                self._providers[key[1]].add(now, self.half_life, hits, delta)
+        self._unknown = self._unknown or unknown
+        # Closed connections are forgotten, their bytes were counted.
+        self._connections = live
+
+    def _entries(
+        self, counters: Iterable[tuple[dict, RuleCounter]]
+    ) -> list[dict[str, Any]]:
+        now = dt_util.utcnow()
+        entries = []
+        for key, counter in counters:
+            hits, size = counter.decayed(now, self.half_life)
+            entries.append(
+                {
+                    **key,
+                    "hits": round(hits, 3),
+                    "bytes": round(size),
+                    "total_hits": counter.total_hits,
+                    "total_bytes": counter.total_bytes,
+                }
+            )
+        return entries
+
+    def summary(self, limit: int | None = None) -> dict[str, Any]:
+        """Return the hottest and the never hit rules and providers."""
+        hit = self._entries(
+            (({"type": rule_type, "payload": payload}, counter))
+            for (rule_type, payload), counter in self._rules.items()
+            if counter.total_hits
+        )
+        never_hit = [
+            {"type": rule_type, "payload": payload}
+            for (rule_type, payload), counter in self._rules.items()
+            if not counter.total_hits
+        ]
+        providers = self._entries(
+            ({"provider": name}, counter) for name, counter in self._providers.items()
+        )
+        return {
+            "rules": len(self._rules),
+            "hottest": sorted(hit, key=_heat, reverse=True)[:limit],
+            "never_hit": never_hit[:limit],
+            "never_hit_count": len(never_hit),
+            "providers": sorted(providers, key=_heat, reverse=True)[:limit],
+        }
+
+
+def _heat(entry: dict[str, Any]) -> tuple[float, int]:
+    return entry["hits"], entry["bytes"]
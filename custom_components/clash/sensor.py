@@ -1,24 +1,45 @@
 """Proxy sensors."""
 
 from ast import literal_eval
+from collections.abc import Callable
 from datetime import datetime
+from functools import partial
 import logging
 
 import aiohttp
 
 from homeassistant import config_entries
 from homeassistant.components.sensor import (
+    DOMAIN as SENSOR_DOMAIN,
     SensorDeviceClass,
     SensorEntity,
     SensorStateClass,
 )
-from homeassistant.const import UnitOfDataRate, UnitOfTime
+from homeassistant.const import UnitOfDataRate, UnitOfInformation, UnitOfTime
 from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.aiohttp_client import async_get_clientsession
 from homeassistant.helpers.device_registry import DeviceInfo
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
-
-from .const import CONF_DELAY, CONF_TRAFFIC, CONF_URLTEST, DOMAIN
+import homeassistant.util.dt as dt_util
+
+from .const import (
+    CONF_AGGREGATE,
+    CONF_DELAY,
+    CONF_SELECTOR,
+    CONF_TRAFFIC,
+    CONF_URLTEST,
+    CONTEXT_EGRESS,
+    CONTEXT_PROVIDERS,
+    CONTEXT_RULES,
+    DOMAIN,
+    LARGE_CATALOG,
+    PROVIDER_PROXIES,
+    PROVIDER_RULES,
+    SIGNAL_RECONCILE,
+)
+from .entity import ClashEntity, EntityReconciler, ProxyEntity, selected_nodes
+from .topology import latest_test
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -34,238 +55,442 @@ async def async_setup_entry(
     #     traffics = config_entry.options.get(CONF_TRAFFIC, [])
 
     coordinator = hass.data[DOMAIN][config_entry.entry_id]["coordinator"]
-    # Add config flow sensors.
-    delays = config_entry.options[CONF_DELAY]
-    urltests = config_entry.options[CONF_URLTEST]
-    traffics = config_entry.options[CONF_TRAFFIC]
-    # Add sensors.
-    sensors = [DelaySensor(coordinator, d) for d in delays]
-    sensors.extend([URLTestSensor(coordinator, d) for d in urltests])
-    sensors.extend([TrafficSensor(hass, coordinator, updown) for updown in traffics])
-
-    async_add_entities(sensors)
+    if config_entry.data.get(CONF_AGGREGATE):
+        async_setup_aggregate_entry(config_entry, coordinator, async_add_entities)
+        return True
+    async_add_entities([RuleHitSensor(coordinator)])
+
+    # Add options flow and provider sensors, kept in line with the options,
+    # the proxies and the providers.
+    reconciler = EntityReconciler(hass, SENSOR_DOMAIN, async_add_entities)
+
+    def wanted() -> dict[tuple[str, ...], Callable[[], SensorEntity]]:
+        options = config_entry.options
+        delays = selected_nodes(coordinator.catalog, options)
+        # Large selections of nodes are registered disabled, only the nodes
+        # enabled afterwards subscribe to the coordinator and get fetched.
+        enabled = len(delays) <= LARGE_CATALOG
+        sensors = {}
+        for d in options[CONF_URLTEST]:
+            sensors[CONF_URLTEST, d] = partial(URLTestSensor, coordinator, d)
+        for d in options[CONF_URLTEST] + options.get(CONF_SELECTOR, []):
+            sensors[CONTEXT_EGRESS, d] = partial(EgressSensor, coordinator, d)
+        for updown in options[CONF_TRAFFIC]:
+            sensors[CONF_TRAFFIC, updown] = partial(
+                TrafficSensor, hass, coordinator, updown
+            )
+        for d in delays:
+            sensors[CONF_DELAY, d] = partial(DelaySensor, coordinator, d, enabled)
+        providers = {
+            PROVIDER_PROXIES: coordinator.proxy_providers,
+            PROVIDER_RULES: coordinator.rule_providers,
+        }
+        for kind, kind_providers in providers.items():
+            for name, provider in kind_providers.items():
+                classes = [ProviderCountSensor, ProviderUpdatedSensor]
+                if provider.get("subscriptionInfo"):
+                    classes.append(ProviderUsageSensor)
+                for cls in classes:
+                    sensors[kind, name, cls._suffix] = partial(
+                        cls, coordinator, kind, name
+                    )
+        return sensors
+
+    async def async_reconcile() -> None:
+        await reconciler.async_reconcile(wanted())
+
+    await async_reconcile()
+    config_entry.async_on_unload(
+        async_dispatcher_connect(
+            hass, SIGNAL_RECONCILE.format(config_entry.entry_id), async_reconcile
+        )
+    )
 
     return True
 
 
-class URLTestSensor(CoordinatorEntity, SensorEntity):
+@callback
+def async_setup_aggregate_entry(
+    config_entry: config_entries.ConfigEntry, coordinator, async_add_entities
+) -> None:
+    """Set up the sensors of the aggregate view."""
+    async_add_entities(
+        [
+            AggregateTrafficSensor(coordinator, "up"),
+            AggregateTrafficSensor(coordinator, "down"),
+            AggregateFastestSensor(coordinator),
+        ]
+    )
+    added = set()
+
+    @callback
+    def add_members() -> None:
+        """Add health sensors of controllers that joined the view."""
+        if not coordinator.data:
+            return
+        if new := coordinator.data.members.keys() - added:
+            added.update(new)
+            async_add_entities([MemberHealthSensor(coordinator, k) for k in new])
+
+    add_members()
+    config_entry.async_on_unload(coordinator.async_add_listener(add_members))
+
+
+class URLTestSensor(ProxyEntity, SensorEntity):
     """Sensors display URLTest and Selector options."""
 
+    _suffix = "urltest"
+
     def __init__(self, coordinator, name) -> None:
         """Initialize."""
-        super().__init__(coordinator, context=name)
-        self.host = coordinator.host
-        self.name_id = name
-        self._proxy = coordinator.data.proxies[name]
+        super().__init__(coordinator, name)
         _LOGGER.info("URLTest sensor %s created", name)
 
+    @callback
+    def _update_from_proxy(self) -> None:
+        """Compute the state and attributes from the proxy."""
+        self._attr_native_value = self._proxy.get("now")
+        self._attr_extra_state_attributes = {"all": self._proxy.get("all", [])}
+
+
+class EgressSensor(ClashEntity, SensorEntity):
+    """Sensor of the node a group finally sends its traffic through."""
+
+    def __init__(self, coordinator, name) -> None:
+        """Initialize."""
+        super().__init__(coordinator, context=(CONTEXT_EGRESS, name))
+        self.name_id = name
+        self._attr_name = f"{name} egress"
+        self._attr_unique_id = f"{DOMAIN}-{self.host}-{self._attr_name}"
+        self._egress = coordinator.topology.resolve(name)
+        _LOGGER.info("Egress sensor %s created", name)
+
     @callback
     def _handle_coordinator_update(self) -> None:
         """Update sensor with latest data from coordinator."""
-        # This method is called by your DataUpdateCoordinator when a successful update runs.
-        self._proxy = self.coordinator.data.proxies[self.name_id]
-        self.async_write_ha_state()
-
-    @property
-    def name(self) -> str:
-        """Return the name of the sensor."""
-        return f"{self._proxy["name"]} urltest"
+        egress = self.coordinator.topology.resolve(self.name_id)
+        changed = egress != self._egress
+        self._egress = egress
+        self._async_write_if_changed(changed)
 
     @property
-    def native_value(self) -> int:
+    def native_value(self) -> str | None:
         """Return the state of the entity."""
-        # Using native value and native unit of measurement, allows you to change units
-        # in Lovelace and HA will automatically calculate the correct value.
-        return self._proxy["now"]
-
-    @property
-    def unique_id(self) -> str:
-        """Return unique id."""
-        # All entities must have a unique id.  Think carefully what you want this to be as
-        # changing it later will cause HA to create new entities.
-        return f"{DOMAIN}-{self.host}-{self.name}"
+        return self._egress.node
 
     @property
     def extra_state_attributes(self):
         """Return the extra state attributes."""
-        # Add any additional attributes you want on your sensor.
-        attrs = {}
-        attrs["all"] = self._proxy["all"]
-        return attrs
-
-    @property
-    def device_info(self) -> DeviceInfo:
-        """Return device information."""
-        # Identifiers are what group entities into the same device.
-        # If your device is created elsewhere, you can just specify the identifiers parameter.
-        # If your device connects via another device, add via_device parameter with the identifiers of that device.
-        return DeviceInfo(
-            identifiers={
-                # Serial numbers are unique identifiers within a specific domain
-                (DOMAIN, self.host)
-            },
-            configuration_url=f"http://{self.host}/ui",
-        )
+        return {
+            "chain": list(self._egress.chain),
+            "delay": self._egress.delay,
+            "cycle": self._egress.cycle,
+        }
 
 
-class DelaySensor(CoordinatorEntity, SensorEntity):
+class DelaySensor(ProxyEntity, SensorEntity):
     """Proxy delay sensor like ss/Trojan etc."""
 
-    def __init__(self, coordinator, name) -> None:
+    _suffix = "delay"
+    # https://developers.home-assistant.io/docs/core/entity/sensor/#available-device-classes
+    _attr_device_class = SensorDeviceClass.DURATION
+    _attr_native_unit_of_measurement = UnitOfTime.MILLISECONDS
+    _attr_state_class = SensorStateClass.MEASUREMENT
+
+    def __init__(self, coordinator, name, enabled_default=True) -> None:
         """Initialize."""
-        super().__init__(coordinator, context=name)
-        self.host = coordinator.host
-        self.name_id = name
-        self._proxy = coordinator.data.proxies[name]
+        super().__init__(coordinator, name)
+        self._attr_entity_registry_enabled_default = enabled_default
         _LOGGER.info("Delay sensor %s created", name)
 
+    @callback
+    def _update_from_proxy(self) -> None:
+        """Compute the state and attributes from the proxy."""
+        test = latest_test(self._proxy)
+        self._attr_native_value = test["delay"] if test else None
+        attrs = {"type": self._proxy.get("type"), "udp": self._proxy.get("udp")}
+        if test:
+            attrs["last_check"] = datetime.fromisoformat(test["time"])
+        self._attr_extra_state_attributes = attrs
+
+
+class ProviderSensor(ClashEntity, SensorEntity):
+    """Base of proxy and rule provider sensors."""
+
+    _suffix: str
+
+    def __init__(self, coordinator, kind, name) -> None:
+        """Initialize."""
+        super().__init__(coordinator, context=CONTEXT_PROVIDERS)
+        self.kind = kind
+        self.name_id = name
+        self._attr_name = f"{name} {self._suffix}"
+        self._attr_unique_id = f"{DOMAIN}-{self.host}-{kind}-{self._attr_name}"
+        self._provider = self._get_provider() or {}
+        _LOGGER.info("Provider sensor %s %s created", name, self._suffix)
+
+    def _get_provider(self) -> dict | None:
+        """Return the provider last known by the coordinator."""
+        if self.kind == PROVIDER_PROXIES:
+            return self.coordinator.proxy_providers.get(self.name_id)
+        return self.coordinator.rule_providers.get(self.name_id)
+
     @callback
     def _handle_coordinator_update(self) -> None:
         """Update sensor with latest data from coordinator."""
-        # This method is called by your DataUpdateCoordinator when a successful update runs.
-        self._proxy = self.coordinator.data.proxies[self.name_id]
-        self.async_write_ha_state()
+        provider = self._get_provider()
+        changed = provider is not None and provider != self._provider
+        if changed:
+            self._provider = provider
+        self._async_write_if_changed(changed)
 
     @property
-    def name(self) -> str:
-        """Return the name of the sensor."""
-        return f"{self._proxy["name"]} delay"
+    def available(self) -> bool:
+        """Return if the provider is still served by the controller."""
+        return super().available and self._get_provider() is not None
+
+
+class ProviderCountSensor(ProviderSensor):
+    """Number of nodes or rules of a provider."""
+
+    _suffix = "count"
+    _attr_state_class = SensorStateClass.MEASUREMENT
 
     @property
     def native_value(self) -> int:
         """Return the state of the entity."""
-        # Using native value and native unit of measurement, allows you to change units
-        # in Lovelace and HA will automatically calculate the correct value.
-        if (self._proxy["history"] is not None) and (len(self._proxy["history"]) > 0):
-            return self._proxy["history"][0]["delay"]
-        return None
+        if self.kind == PROVIDER_PROXIES:
+            return len(self._provider.get("proxies") or [])
+        return self._provider.get("ruleCount")
 
     @property
-    def device_class(self) -> str | None:
-        """Return device class."""
-        # https://developers.home-assistant.io/docs/core/entity/sensor/#available-device-classes
-        return SensorDeviceClass.DURATION
+    def extra_state_attributes(self):
+        """Return the extra state attributes."""
+        return {
+            "type": self._provider.get("vehicleType"),
+            "behavior": self._provider.get("behavior"),
+        }
 
-    @property
-    def device_info(self) -> DeviceInfo:
-        """Return device information."""
-        # Identifiers are what group entities into the same device.
-        # If your device is created elsewhere, you can just specify the identifiers parameter.
-        # If your device connects via another device, add via_device parameter with the identifiers of that device.
-        return DeviceInfo(
-            identifiers={
-                # Serial numbers are unique identifiers within a specific domain
-                (DOMAIN, self.host)
-            },
-            configuration_url=f"http://{self.host}/ui",
-        )
 
-    @property
-    def native_unit_of_measurement(self) -> str:
-        """Return unit of temperature."""
-        return UnitOfTime.MILLISECONDS
+class ProviderUpdatedSensor(ProviderSensor):
+    """Last update time of a provider."""
+
+    _suffix = "updated"
+    _attr_device_class = SensorDeviceClass.TIMESTAMP
 
     @property
-    def state_class(self) -> str:
-        """Return state class."""
-        # https://developers.home-assistant.io/docs/core/entity/sensor/#available-state-classes
-        return SensorStateClass.MEASUREMENT
+    def native_value(self) -> datetime | None:
+        """Return the state of the entity."""
+        updated = dt_util.parse_datetime(self._provider.get("updatedAt") or "")
+        # Providers that were never updated report the zero time.
+        if updated is None or updated.year == 1:
+            return None
+        return updated
+
+
+class ProviderUsageSensor(ProviderSensor):
+    """Subscription traffic used of a proxy provider."""
+
+    _suffix = "usage"
+    _attr_device_class = SensorDeviceClass.DATA_SIZE
+    _attr_native_unit_of_measurement = UnitOfInformation.BYTES
+    _attr_state_class = SensorStateClass.TOTAL
 
     @property
-    def unique_id(self) -> str:
-        """Return unique id."""
-        # All entities must have a unique id.  Think carefully what you want this to be as
-        # changing it later will cause HA to create new entities.
-        return f"{DOMAIN}-{self.host}-{self.name}"
+    def native_value(self) -> int | None:
+        """Return the state of the entity."""
+        if not (info := self._provider.get("subscriptionInfo")):
+            return None
+        return info.get("Upload", 0) + info.get("Download", 0)
 
     @property
     def extra_state_attributes(self):
         """Return the extra state attributes."""
-        # Add any additional attributes you want on your sensor.
-        attrs = {}
-        attrs["type"] = self._proxy["type"]
-        attrs["udp"] = self._proxy["udp"]
-        if (self._proxy["history"] is not None) and (len(self._proxy["history"]) > 0):
-            attrs["last_check"] = datetime.fromisoformat(
-                self._proxy["history"][0]["time"]
-            )
+        info = self._provider.get("subscriptionInfo") or {}
+        attrs = {"upload": info.get("Upload"), "download": info.get("Download")}
+        attrs["total"] = info.get("Total")
+        if info.get("Expire"):
+            attrs["expire"] = dt_util.utc_from_timestamp(info["Expire"])
         return attrs
 
 
 class TrafficSensor(SensorEntity):
     """Traffic sensor of updown speed."""
 
+    _attr_native_unit_of_measurement = UnitOfDataRate.KILOBYTES_PER_SECOND
+    # https://developers.home-assistant.io/docs/core/entity/sensor/#available-state-classes
+    _attr_state_class = SensorStateClass.MEASUREMENT
+    _attr_should_poll = False
+
     def __init__(self, hass: HomeAssistant, coordinator, updown) -> None:
         """Initialize."""
-        self.value = None
         self.updown = updown
         self.session = async_get_clientsession(hass=hass, verify_ssl=False)
         self.host = coordinator.host
         self.headers = coordinator.headers
-        self._attr_should_poll = False
-
-    @property
-    def name(self) -> str:
-        """Return the name of the sensor."""
-        return f"traffic {self.updown}"
-
-    @property
-    def native_value(self) -> float:
-        """Return the state of the entity."""
-        # Using native value and native unit of measurement, allows you to change units
-        # in Lovelace and HA will automatically calculate the correct value.
-        return self.value
-
-    @property
-    def native_unit_of_measurement(self) -> str:
-        """Return unit of KB/s."""
-        return UnitOfDataRate.KILOBYTES_PER_SECOND
-
-    @property
-    def unique_id(self) -> str:
-        """Return unique id."""
-        # All entities must have a unique id.  Think carefully what you want this to be as
-        # changing it later will cause HA to create new entities.
-        return f"{DOMAIN}-{self.host}-{self.name}"
-
-    @property
-    def device_info(self) -> DeviceInfo:
-        """Return device information."""
-        # Identifiers are what group entities into the same device.
-        # If your device is created elsewhere, you can just specify the identifiers parameter.
-        # If your device connects via another device, add via_device parameter with the identifiers of that device.
-        return DeviceInfo(
+        self._attr_name = f"traffic {updown}"
+        self._attr_unique_id = f"{DOMAIN}-{self.host}-{self._attr_name}"
+        self._attr_device_info = DeviceInfo(
             identifiers={
                 # Serial numbers are unique identifiers within a specific domain
                 (DOMAIN, self.host)
             },
             configuration_url=f"http://{self.host}/ui",
         )
-
-    @property
-    def state_class(self) -> str:
-        """Return state class."""
-        # https://developers.home-assistant.io/docs/core/entity/sensor/#available-state-classes
-        return SensorStateClass.MEASUREMENT
+        self._ws = None
+        self._task = None
 
     async def async_added_to_hass(self) -> None:
         """Update all sensors."""
         # Use this to setup async function callbacks when using push method.
-        ws = await self.session.ws_connect(
+        self._ws = ws = await self.session.ws_connect(
             f"http://{self.host}/traffic", headers=self.headers
         )
-        self.hass.loop.create_task(self.async_receive_msg(ws))
+        self._task = self.hass.loop.create_task(self.async_receive_msg(ws))
+
+    async def async_will_remove_from_hass(self) -> None:
+        """Close the traffic stream."""
+        if self._task is not None:
+            self._task.cancel()
+        if self._ws is not None:
+            await self._ws.close()
+
+    @callback
+    def _handle_message(self, data: str) -> None:
+        """Parse a traffic frame and write the state when it changed."""
+        value = float(literal_eval(data[:-1])[self.updown]) / 1024
+        if self._attr_native_value != value:
+            self._attr_native_value = value
+            # _LOGGER.debug("Traffic %s: %f", self.updown, value)
+            self.async_write_ha_state()
 
     async def async_receive_msg(self, ws) -> None:
         """Receive message and write into ha."""
         async for msg in ws:
             if msg.type == aiohttp.WSMsgType.TEXT:
-                value = float(literal_eval(msg.data[:-1])[self.updown]) / 1024
-                if self.value != value:
-                    self.value = value
-                    # _LOGGER.debug("Traffic %s: %f", self.updown, self.value)
-                    self.schedule_update_ha_state()
+                self._handle_message(msg.data)
             elif msg.type == (aiohttp.WSMsgType.CLOSE or aiohttp.WSMsgType.ERROR):
-                ws = await self.session.ws_connect(
+                self._ws = ws = await self.session.ws_connect(
                     f"http://{self.host}/traffic", headers=self.headers
                 )
+
+
+class RuleHitSensor(ClashEntity, SensorEntity):
+    """Rules that never matched a connection, with the hottest rules."""
+
+    # Following every connection costs a request per update.
+    _attr_entity_registry_enabled_default = False
+    _attr_name = "rules never hit"
+    _attr_state_class = SensorStateClass.MEASUREMENT
+
+    def __init__(self, coordinator) -> None:
+        """Initialize."""
+        super().__init__(coordinator, context=CONTEXT_RULES)
+        self._attr_unique_id = f"{DOMAIN}-{self.host}-{self._attr_name}"
+        self._stats = coordinator.data.rule_stats
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        """Update sensor with latest data from coordinator."""
+        stats = self.coordinator.data.rule_stats
+        changed = bool(stats) and stats != self._stats
+        if changed:
+            self._stats = stats
+        self._async_write_if_changed(changed)
+
+    @property
+    def native_value(self) -> int | None:
+        """Return the state of the entity."""
+        return self._stats.get("never_hit_count")
+
+    @property
+    def extra_state_attributes(self):
+        """Return the extra state attributes."""
+        return {
+            "rules": self._stats.get("rules"),
+            "hottest": self._stats.get("hottest"),
+            "never_hit": self._stats.get("never_hit"),
+            "providers": self._stats.get("providers"),
+        }
+
+
+class AggregateSensor(CoordinatorEntity, SensorEntity):
+    """Base of the sensors combining every controller."""
+
+    _attr_device_info = DeviceInfo(
+        identifiers={(DOMAIN, CONF_AGGREGATE)},
+        name="Clash aggregate",
+    )
+
+
+class AggregateTrafficSensor(AggregateSensor):
+    """Total traffic speed of every controller."""
+
+    _attr_native_unit_of_measurement = UnitOfDataRate.KILOBYTES_PER_SECOND
+    _attr_state_class = SensorStateClass.MEASUREMENT
+
+    def __init__(self, coordinator, updown) -> None:
+        """Initialize."""
+        super().__init__(coordinator)
+        self.updown = updown
+        self._attr_name = f"aggregate traffic {updown}"
+        self._attr_unique_id = f"{DOMAIN}-{CONF_AGGREGATE}-traffic-{updown}"
+
+    @property
+    def native_value(self) -> float:
+        """Return the state of the entity."""
+        return round(getattr(self.coordinator.data, self.updown), 2)
+
+
+class AggregateFastestSensor(AggregateSensor):
+    """Node with the lowest delay available on every controller."""
+
+    _attr_name = "aggregate fastest node"
+    _attr_unique_id = f"{DOMAIN}-{CONF_AGGREGATE}-fastest"
+
+    @property
+    def native_value(self) -> str | None:
+        """Return the state of the entity."""
+        return self.coordinator.data.fastest
+
+    @property
+    def extra_state_attributes(self):
+        """Return the extra state attributes."""
+        return {"delays": self.coordinator.data.fastest_delays}
+
+
+class MemberHealthSensor(AggregateSensor):
+    """Poll latency and health of one controller in the aggregate view."""
+
+    _attr_device_class = SensorDeviceClass.DURATION
+    _attr_native_unit_of_measurement = UnitOfTime.MILLISECONDS
+    _attr_state_class = SensorStateClass.MEASUREMENT
+
+    def __init__(self, coordinator, entry_id) -> None:
+        """Initialize."""
+        super().__init__(coordinator)
+        self.entry_id = entry_id
+        self.host = coordinator.data.members[entry_id].host
+        self._attr_name = f"{self.host} health"
+        self._attr_unique_id = f"{DOMAIN}-{CONF_AGGREGATE}-{self.host}-health"
+
+    @property
+    def available(self) -> bool:
+        """Return if the controller is still part of the view."""
+        return super().available and self.entry_id in self.coordinator.data.members
+
+    @property
+    def native_value(self) -> float | None:
+        """Return the state of the entity."""
+        return self.coordinator.data.members[self.entry_id].latency
+
+    @property
+    def extra_state_attributes(self):
+        """Return the extra state attributes."""
+        status = self.coordinator.data.members[self.entry_id]
+        return {
+            "healthy": status.healthy,
+            "error": status.error,
+            "traffic_up": status.up,
+            "traffic_down": status.down,
+        }
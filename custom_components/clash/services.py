@@ -0,0 +1,261 @@
+"""Clash services."""
+
+import asyncio
+import logging
+
+from aiohttp import ClientError
+import voluptuous as vol
+
+from homeassistant.config_entries import ConfigEntryState
+from homeassistant.core import (
+    HomeAssistant,
+    ServiceCall,
+    ServiceResponse,
+    SupportsResponse,
+    callback,
+)
+from homeassistant.exceptions import ServiceValidationError
+import homeassistant.helpers.config_validation as cv
+from homeassistant.helpers.event import async_call_later
+
+from .const import (
+    ATTR_CONFIG_ENTRY_ID,
+    ATTR_DURATION,
+    ATTR_GROUPS,
+    ATTR_HEALTHCHECK,
+    ATTR_INTERVAL,
+    ATTR_MODE,
+    ATTR_NAMES,
+    ATTR_PROVIDERS,
+    ATTR_TYPES,
+    CONF_AGGREGATE,
+    DATA_PROFILER,
+    DNS_QUERY_TYPES,
+    DOMAIN,
+    MODES,
+    PROVIDER_PROXIES,
+    PROVIDER_RULES,
+    SERVICE_APPLY_PROFILE,
+    SERVICE_DNS_QUERY,
+    SERVICE_PROFILE,
+    SERVICE_UPDATE_PROVIDERS,
+)
+from .coordinator import ClashCoordinator
+from .profiler import ClashProfiler
+
+_LOGGER = logging.getLogger(__name__)
+
+APPLY_PROFILE_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_CONFIG_ENTRY_ID): cv.string,
+        vol.Required(ATTR_GROUPS): {cv.string: cv.string},
+        vol.Optional(ATTR_MODE): vol.All(cv.string, vol.Capitalize, vol.In(MODES)),
+    }
+)
+
+UPDATE_PROVIDERS_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_CONFIG_ENTRY_ID): cv.string,
+        vol.Optional(ATTR_PROVIDERS): vol.All(cv.ensure_list, [cv.string]),
+        vol.Optional(ATTR_HEALTHCHECK, default=False): cv.boolean,
+    }
+)
+
+PROFILE_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_DURATION, default=60): vol.All(
+            vol.Coerce(float), vol.Range(min=1, max=3600)
+        ),
+        vol.Optional(ATTR_INTERVAL, default=5): vol.All(
+            vol.Coerce(float), vol.Range(min=1, max=1000)
+        ),
+    }
+)
+
+DNS_QUERY_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_CONFIG_ENTRY_ID): cv.string,
+        vol.Required(ATTR_NAMES): vol.All(
+            cv.ensure_list, [cv.string], vol.Length(min=1)
+        ),
+        vol.Optional(ATTR_TYPES, default=["A"]): vol.All(
+            cv.ensure_list, [vol.All(cv.string, vol.Upper, vol.In(DNS_QUERY_TYPES))]
+        ),
+    }
+)
+
+
+def async_setup_services(hass: HomeAssistant) -> None:
+    """Register integration services."""
+
+    async def async_apply_profile(call: ServiceCall) -> ServiceResponse:
+        """Apply many selector options and the clash mode at once."""
+        coordinator = _get_coordinator(hass, call)
+        groups: dict[str, str] = call.data[ATTR_GROUPS]
+        mode: str | None = call.data.get(ATTR_MODE)
+
+        # Validate the whole profile before sending anything to the controller.
+        for group, option in groups.items():
+            proxy = coordinator.catalog.get(group)
+            if proxy is None or proxy["type"] != "Selector":
+                raise ServiceValidationError(f"{group} is not a selector group")
+            if option not in proxy["all"]:
+                raise ServiceValidationError(f"{option} is not an option of {group}")
+
+        async def select(group: str, option: str) -> dict:
+            try:
+                await coordinator.select_selector(group, option)
+            except (ClientError, TimeoutError) as err:
+                _LOGGER.warning("Failed to select %s for %s: %s", option, group, err)
+                return {"option": option, "success": False, "error": str(err)}
+            return {"option": option, "success": True}
+
+        # select_selector is bounded by the coordinator request limit.
+        results = await asyncio.gather(
+            *(select(group, option) for group, option in groups.items())
+        )
+        response: dict = {ATTR_GROUPS: dict(zip(groups, results, strict=True))}
+
+        if mode is not None:
+            try:
+                await coordinator.select_mode(mode)
+            except (ClientError, TimeoutError) as err:
+                response[ATTR_MODE] = {
+                    "option": mode,
+                    "success": False,
+                    "error": str(err),
+                }
+            else:
+                response[ATTR_MODE] = {"option": mode, "success": True}
+
+        await coordinator.async_refresh()
+        return response
+
+    async def async_update_providers(call: ServiceCall) -> ServiceResponse:
+        """Update or health check providers concurrently."""
+        coordinator = _get_coordinator(hass, call)
+        healthcheck: bool = call.data[ATTR_HEALTHCHECK]
+        # Rule providers have no nodes to health check.
+        kinds = (
+            (PROVIDER_PROXIES,) if healthcheck else (PROVIDER_PROXIES, PROVIDER_RULES)
+        )
+        proxy_providers, rule_providers = await coordinator.update_providers()
+        available = {PROVIDER_PROXIES: proxy_providers, PROVIDER_RULES: rule_providers}
+        targets = [
+            (kind, name)
+            for kind in kinds
+            for name in available[kind]
+            if ATTR_PROVIDERS not in call.data or name in call.data[ATTR_PROVIDERS]
+        ]
+        if ATTR_PROVIDERS in call.data:
+            missing = set(call.data[ATTR_PROVIDERS]) - {name for _, name in targets}
+            if missing:
+                raise ServiceValidationError(
+                    f"Unknown providers: {', '.join(sorted(missing))}"
+                )
+
+        async def run(kind: str, name: str) -> dict:
+            try:
+                elapsed = await coordinator.provider_action(kind, name, healthcheck)
+            except (ClientError, TimeoutError) as err:
+                _LOGGER.warning("Failed to refresh provider %s: %s", name, err)
+                return {"success": False, "error": str(err)}
+            return {"success": True, "elapsed_ms": round(elapsed * 1000)}
+
+        # provider_action is bounded by the coordinator request limit.
+        results = await asyncio.gather(*(run(kind, name) for kind, name in targets))
+        response: dict = {kind: {} for kind in kinds}
+        for (kind, name), result in zip(targets, results, strict=True):
+            response[kind][name] = result
+
+        # Provider data is otherwise only refreshed with the catalog.
+        await coordinator.update_providers()
+        await coordinator.async_refresh()
+        return response
+
+    async def async_profile(call: ServiceCall) -> None:
+        """Profile the integration, the report is part of the diagnostics."""
+        profiler: ClashProfiler | None = hass.data.get(DATA_PROFILER)
+        if profiler is not None and profiler.running:
+            raise ServiceValidationError("Profiling is already running")
+        profiler = ClashProfiler(hass, call.data[ATTR_INTERVAL] / 1000)
+        hass.data[DATA_PROFILER] = profiler
+        profiler.async_start()
+
+        @callback
+        def async_stop(_now) -> None:
+            profiler.async_stop()
+
+        async_call_later(hass, call.data[ATTR_DURATION], async_stop)
+
+    async def async_dns_query(call: ServiceCall) -> ServiceResponse:
+        """Resolve names through the controller, like its rules see them."""
+        coordinator = _get_coordinator(hass, call)
+        # Names are case insensitive and the same with or without the root dot.
+        names = list(
+            dict.fromkeys(n.strip().rstrip(".").lower() for n in call.data[ATTR_NAMES])
+        )
+        types = list(dict.fromkeys(call.data[ATTR_TYPES]))
+
+        async def query(name: str, qtype: str) -> dict:
+            try:
+                return await coordinator.query_dns(name, qtype)
+            except (ClientError, TimeoutError) as err:
+                _LOGGER.warning("Failed to resolve %s %s: %s", qtype, name, err)
+                return {"error": str(err)}
+            except (KeyError, TypeError, ValueError) as err:
+                _LOGGER.warning("Malformed answer to %s %s: %r", qtype, name, err)
+                return {"error": f"malformed answer: {err!r}"}
+
+        # query_dns is bounded by the coordinator request limit.
+        queries = [(name, qtype) for name in names for qtype in types]
+        results = await asyncio.gather(*(query(name, qtype) for name, qtype in queries))
+        response: dict = {ATTR_NAMES: {name: {} for name in names}}
+        for (name, qtype), result in zip(queries, results, strict=True):
+            response[ATTR_NAMES][name][qtype] = result
+        return response
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_APPLY_PROFILE,
+        async_apply_profile,
+        schema=APPLY_PROFILE_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_UPDATE_PROVIDERS,
+        async_update_providers,
+        schema=UPDATE_PROVIDERS_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_DNS_QUERY,
+        async_dns_query,
+        schema=DNS_QUERY_SCHEMA,
+        supports_response=SupportsResponse.ONLY,
+    )
+    hass.services.async_register(
+        DOMAIN, SERVICE_PROFILE, async_profile, schema=PROFILE_SCHEMA
+    )
+
+
+def _get_coordinator(hass: HomeAssistant, call: ServiceCall) -> ClashCoordinator:
+    """Return the coordinator addressed by a service call."""
+    entry_ids = [
+        entry.entry_id
+        for entry in hass.config_entries.async_entries(DOMAIN)
+        if entry.state is ConfigEntryState.LOADED and not entry.data.get(CONF_AGGREGATE)
+    ]
+    if ATTR_CONFIG_ENTRY_ID in call.data:
+        entry_id = call.data[ATTR_CONFIG_ENTRY_ID]
+        if entry_id not in entry_ids:
+            raise ServiceValidationError(f"Config entry {entry_id} is not loaded")
+    elif len(entry_ids) == 1:
+        entry_id = entry_ids[0]
+    else:
+        raise ServiceValidationError(
+            f"{ATTR_CONFIG_ENTRY_ID} is required with {len(entry_ids)} loaded entries"
+        )
+    return hass.data[DOMAIN][entry_id]["coordinator"]
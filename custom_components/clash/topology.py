@@ -0,0 +1,98 @@
+"""Proxy group topology."""
+
+from collections import defaultdict
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class Egress:
+    """Resolved path from a group to the node traffic leaves through."""
+
+    chain: tuple[str, ...]
+    node: str | None
+    delay: int | None
+    cycle: bool
+
+
+def latest_test(proxy: dict) -> dict | None:
+    """Return the most recent delay test of a proxy, its history is oldest first."""
+    if history := proxy.get("history"):
+        return history[-1]
+    return None
+
+
+def latest_delay(proxy: dict) -> int | None:
+    """Return the most recent delay test result of a proxy."""
+    if test := latest_test(proxy):
+        return test["delay"]
+    return None
+
+
+class ProxyGraph:
+    """Index of which proxy every group currently points to.
+
+    Resolved chains are cached and only dropped when a proxy on the chain
+    changes its selection or delay.
+    """
+
+    def __init__(self) -> None:
+        """Initialize."""
+        self._edges: dict[str, str] = {}
+        self._delays: dict[str, int | None] = {}
+        self._resolved: dict[str, Egress] = {}
+        # Proxy name to the groups whose cached chain passes through it.
+        self._dependents: defaultdict[str, set[str]] = defaultdict(set)
+
+    def update(self, proxies: dict[str, dict | None]) -> None:
+        """Merge fetched proxies into the graph."""
+        changed = set()
+        for name, proxy in proxies.items():
+            if proxy is None:
+                continue
+            edge = proxy.get("now") or None
+            if self._edges.get(name) != edge:
+                if edge is None:
+                    self._edges.pop(name, None)
+                else:
+                    self._edges[name] = edge
+                changed.add(name)
+            delay = latest_delay(proxy)
+            if name not in self._delays or self._delays[name] != delay:
+                self._delays[name] = delay
+                changed.add(name)
+        for name in changed:
+            for group in self._dependents.pop(name, ()):
+                self._resolved.pop(group, None)
+
+    def remove(self, names) -> None:
+        """Forget proxies that no longer exist."""
+        for name in names:
+            self._edges.pop(name, None)
+            self._delays.pop(name, None)
+            for group in self._dependents.pop(name, ()):
+                self._resolved.pop(group, None)
+
+    def resolve(self, name: str) -> Egress:
+        """Follow the selections of a group down to its egress node."""
+        if (egress := self._resolved.get(name)) is not None:
+            return egress
+        chain = [name]
+        seen = {name}
+        cycle = False
+        while (target := self._edges.get(chain[-1])) is not None:
+            if target in seen:
+                cycle = True
+                break
+            chain.append(target)
+            seen.add(target)
+        node = None if cycle else chain[-1]
+        egress = Egress(
+            chain=tuple(chain),
+            node=node,
+            delay=None if node is None else self._delays.get(node),
+            cycle=cycle,
+        )
+        for member in chain:
+            self._dependents[member].add(name)
+        self._resolved[name] = egress
+        return egress
@@ -1,14 +1,113 @@
 """Fixtures for testing."""
 
+from collections.abc import Awaitable, Callable
+from copy import deepcopy
+
 import pytest
+from pytest_homeassistant_custom_component.common import MockConfigEntry
 from pytest_socket import enable_socket, disable_socket, socket_allow_hosts
 
+from homeassistant.const import CONF_HOST
+from homeassistant.core import HomeAssistant
+
+from custom_components.clash.const import (
+    CONF_DELAY,
+    CONF_SELECTOR,
+    CONF_TRAFFIC,
+    CONF_URLTEST,
+    DOMAIN,
+)
+
+HOST = "127.0.0.1:9090"
+PROXIES = {
+    "Streaming": {
+        "name": "Streaming",
+        "type": "Selector",
+        "now": "Japan",
+        "all": ["Japan", "Taiwan"],
+    },
+    "Work": {
+        "name": "Work",
+        "type": "Selector",
+        "now": "DIRECT",
+        "all": ["DIRECT", "Japan"],
+    },
+    "Japan": {
+        "name": "Japan",
+        "type": "Shadowsocks",
+        "udp": True,
+        "history": [{"time": "2024-06-01T00:00:00.000Z", "delay": 120}],
+    },
+}
+
+
 @pytest.fixture(autouse=True)
 def auto_enable_custom_integrations(enable_custom_integrations):
     """Enable custom integrations."""
     return
 
+
 @pytest.hookimpl(trylast=True)
 def pytest_runtest_setup():
     enable_socket()
-    socket_allow_hosts(["127.0.0.1", "localhost", "::1", "192.168.0.123"], allow_unix_socket=True)
\ No newline at end of file
+    socket_allow_hosts(
+        ["127.0.0.1", "localhost", "::1", "192.168.0.123"], allow_unix_socket=True
+    )
+
+
+@pytest.fixture
+def proxies() -> dict[str, dict]:
+    """Return the proxies and groups served by the mocked controller."""
+    return deepcopy(PROXIES)
+
+
+@pytest.fixture
+def mock_controller(aioclient_mock) -> Callable[..., str]:
+    """Return a function mocking a controller, it returns the controller URL."""
+
+    def mock(
+        proxies: dict[str, dict],
+        host: str = HOST,
+        proxy_providers: dict[str, dict] | None = None,
+        rule_providers: dict[str, dict] | None = None,
+    ) -> str:
+        url = f"http://{host}"
+        aioclient_mock.get(f"{url}/proxies", json={"proxies": proxies})
+        aioclient_mock.get(f"{url}/configs", json={"mode": "rule"})
+        aioclient_mock.get(
+            f"{url}/providers/proxies", json={"providers": proxy_providers or {}}
+        )
+        aioclient_mock.get(
+            f"{url}/providers/rules", json={"providers": rule_providers or {}}
+        )
+        for name, proxy in proxies.items():
+            aioclient_mock.get(f"{url}/proxies/{name}", json=proxy)
+        return url
+
+    return mock
+
+
+@pytest.fixture
+def setup_entry(hass: HomeAssistant) -> Callable[..., Awaitable[MockConfigEntry]]:
+    """Return a function setting up a config entry of a controller."""
+
+    async def setup(
+        delays=(), selectors=(), *, host: str = HOST, **options
+    ) -> MockConfigEntry:
+        entry = MockConfigEntry(
+            domain=DOMAIN,
+            data={CONF_HOST: host},
+            options={
+                CONF_DELAY: list(delays),
+                CONF_URLTEST: [],
+                CONF_TRAFFIC: [],
+                CONF_SELECTOR: list(selectors),
+                **options,
+            },
+        )
+        entry.add_to_hass(hass)
+        assert await hass.config_entries.async_setup(entry.entry_id)
+        await hass.async_block_till_done()
+        return entry
+
+    return setup
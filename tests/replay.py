@@ -0,0 +1,314 @@
+"""Record and replay Clash controller traffic.
+
+A recording is a JSON lines file, gzip compressed when its name ends with
+``.gz``. The first line is a header, every following line is either a REST
+exchange::
+
+    {"http": "GET /proxies", "status": 200, "ms": 2.1, "body": "..."}
+
+or a frame of a websocket stream, offset in seconds from the stream opening::
+
+    {"ws": "/traffic", "t": 0.5, "data": "..."}
+
+Record a live controller by pointing the integration at the recorder::
+
+    python -m tests.replay 192.168.1.2:9090 session.jsonl.gz --port 9091
+"""
+
+from abc import ABC, abstractmethod
+import argparse
+import asyncio
+from collections import defaultdict, deque
+from dataclasses import dataclass, field
+import gzip
+import json
+import math
+from pathlib import Path
+import time
+
+from aiohttp import ClientSession, WSMsgType, web
+
+FORMAT_VERSION = 1
+# Request headers forwarded to the controller while recording.
+FORWARDED_HEADERS = ("authorization", "content-type")
+
+
+@dataclass
+class Exchange:
+    """A recorded REST request and its response."""
+
+    method: str
+    path: str
+    status: int
+    body: str
+    latency: float = 0.0
+
+    @property
+    def key(self) -> str:
+        """Return the request line the exchange answers."""
+        return f"{self.method} {self.path}"
+
+
+@dataclass
+class Recording:
+    """REST exchanges and websocket frames of a controller session."""
+
+    exchanges: list[Exchange] = field(default_factory=list)
+    # Stream path to (offset, data) frames.
+    streams: defaultdict[str, list[tuple[float, str]]] = field(
+        default_factory=lambda: defaultdict(list)
+    )
+
+    @classmethod
+    def load(cls, path: Path) -> "Recording":
+        """Read a recording."""
+        recording = cls()
+        opener = gzip.open if Path(path).suffix == ".gz" else open
+        with opener(path, "rt", encoding="utf-8") as file:
+            header = json.loads(next(file))
+            if header.get("version") != FORMAT_VERSION:
+                raise ValueError(f"Unsupported recording version {header}")
+            for line in file:
+                item = json.loads(line)
+                if "http" in item:
+                    method, _, request = item["http"].partition(" ")
+                    recording.exchanges.append(
+                        Exchange(
+                            method,
+                            request,
+                            item["status"],
+                            item["body"],
+                            item.get("ms", 0) / 1000,
+                        )
+                    )
+                else:
+                    recording.streams[item["ws"]].append((item["t"], item["data"]))
+        return recording
+
+    def dump(self, path: Path) -> None:
+        """Write the recording."""
+        opener = gzip.open if Path(path).suffix == ".gz" else open
+        with opener(path, "wt", encoding="utf-8") as file:
+            file.write(json.dumps({"version": FORMAT_VERSION}) + "\n")
+            for exchange in self.exchanges:
+                item = {
+                    "http": exchange.key,
+                    "status": exchange.status,
+                    "ms": round(exchange.latency * 1000, 3),
+                    "body": exchange.body,
+                }
+                file.write(json.dumps(item, separators=(",", ":")) + "\n")
+            for stream, frames in self.streams.items():
+                for offset, data in frames:
+                    item = {"ws": stream, "t": round(offset, 4), "data": data}
+                    file.write(json.dumps(item, separators=(",", ":")) + "\n")
+
+
+class _Server(ABC):
+    """Local aiohttp server answering every path with one handler."""
+
+    def __init__(self) -> None:
+        self._runner: web.AppRunner | None = None
+        self._sockets: set[web.WebSocketResponse] = set()
+        self.host = ""
+
+    async def start(self, port: int = 0) -> str:
+        """Start listening and return the host to configure the integration with."""
+        app = web.Application()
+        app.router.add_route("*", "/{path:.*}", self._handle)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, "127.0.0.1", port)
+        await site.start()
+        port = self._runner.addresses[0][1]
+        self.host = f"127.0.0.1:{port}"
+        return self.host
+
+    async def stop(self) -> None:
+        """Close the open streams and stop listening."""
+        for ws in list(self._sockets):
+            await ws.close()
+        if self._runner is not None:
+            await self._runner.cleanup()
+
+    async def _handle(self, request: web.Request) -> web.StreamResponse:
+        if request.headers.get("upgrade", "").lower() == "websocket":
+            ws = web.WebSocketResponse()
+            await ws.prepare(request)
+            self._sockets.add(ws)
+            try:
+                await self._stream(request, ws)
+            finally:
+                self._sockets.discard(ws)
+            return ws
+        return await self._respond(request)
+
+    @abstractmethod
+    async def _respond(self, request: web.Request) -> web.Response:
+        """Answer a plain HTTP request."""
+
+    @abstractmethod
+    async def _stream(self, request: web.Request, ws: web.WebSocketResponse) -> None:
+        """Serve a websocket until either side closes it."""
+
+
+class Recorder(_Server):
+    """Reverse proxy recording the traffic between a client and a controller."""
+
+    def __init__(self, upstream: str) -> None:
+        """Initialize."""
+        super().__init__()
+        self.upstream = upstream
+        self.recording = Recording()
+        self._session: ClientSession | None = None
+
+    async def start(self, port: int = 0) -> str:
+        """Start proxying."""
+        self._session = ClientSession()
+        return await super().start(port)
+
+    async def stop(self) -> None:
+        """Stop proxying."""
+        await super().stop()
+        if self._session is not None:
+            await self._session.close()
+
+    def _forward(self, request: web.Request) -> dict[str, str]:
+        return {
+            name: request.headers[name]
+            for name in FORWARDED_HEADERS
+            if name in request.headers
+        }
+
+    async def _respond(self, request: web.Request) -> web.Response:
+        start = time.perf_counter()
+        async with self._session.request(
+            request.method,
+            f"http://{self.upstream}{request.path_qs}",
+            headers=self._forward(request),
+            data=await request.read(),
+        ) as resp:
+            body = await resp.text()
+        self.recording.exchanges.append(
+            Exchange(
+                request.method,
+                request.path_qs,
+                resp.status,
+                body,
+                time.perf_counter() - start,
+            )
+        )
+        return web.Response(
+            status=resp.status, text=body, content_type=resp.content_type
+        )
+
+    async def _stream(self, request: web.Request, ws: web.WebSocketResponse) -> None:
+        async with self._session.ws_connect(
+            f"http://{self.upstream}{request.path_qs}",
+            headers=self._forward(request),
+        ) as upstream:
+            relay = asyncio.create_task(
+                self._relay(upstream, ws, self.recording.streams[request.path_qs])
+            )
+            # Streams only flow from the controller, wait for the client to leave.
+            async for _msg in ws:
+                pass
+            await upstream.close()
+            await relay
+
+    async def _relay(self, upstream, ws: web.WebSocketResponse, frames: list) -> None:
+        start = time.perf_counter()
+        async for msg in upstream:
+            if msg.type is not WSMsgType.TEXT:
+                break
+            frames.append((time.perf_counter() - start, msg.data))
+            if not ws.closed:
+                await ws.send_str(msg.data)
+
+
+class ReplayServer(_Server):
+    """Serve a recording back like the controller it was recorded from.
+
+    REST responses are served in recorded order per request line, the last
+    one repeating once they run out. Latencies and frame offsets are divided
+    by ``speed``, ``math.inf`` replays without any delay.
+    """
+
+    def __init__(self, recording: Recording, speed: float = 1.0) -> None:
+        """Initialize."""
+        super().__init__()
+        self.recording = recording
+        self.speed = speed
+        self._responses: defaultdict[str, deque[Exchange]] = defaultdict(deque)
+        for exchange in recording.exchanges:
+            self._responses[exchange.key].append(exchange)
+        # Request lines served, in order.
+        self.requests: list[str] = []
+        # Seconds every request served was delayed, in the same order.
+        self.delays: list[float] = []
+        # Frames sent per stream path.
+        self.frames_sent: defaultdict[str, int] = defaultdict(int)
+        # Seconds from the stream opening to every frame sent, per stream path.
+        self.frame_times: defaultdict[str, list[float]] = defaultdict(list)
+
+    def _scale(self, seconds: float) -> float:
+        return 0 if math.isinf(self.speed) else seconds / self.speed
+
+    async def _delay(self, seconds: float) -> None:
+        await asyncio.sleep(self._scale(seconds))
+
+    async def _respond(self, request: web.Request) -> web.Response:
+        key = f"{request.method} {request.path_qs}"
+        self.requests.append(key)
+        if not (responses := self._responses.get(key)):
+            self.delays.append(0.0)
+            return web.Response(status=404, text=f"{key} was not recorded")
+        exchange = responses.popleft() if len(responses) > 1 else responses[0]
+        self.delays.append(self._scale(exchange.latency))
+        await self._delay(exchange.latency)
+        return web.Response(
+            status=exchange.status,
+            text=exchange.body,
+            content_type="application/json",
+        )
+
+    async def _stream(self, request: web.Request, ws: web.WebSocketResponse) -> None:
+        start = time.perf_counter()
+        for offset, data in self.recording.streams.get(request.path_qs, ()):
+            await self._delay(offset - (time.perf_counter() - start) * self.speed)
+            if ws.closed:
+                return
+            await ws.send_str(data)
+            self.frames_sent[request.path_qs] += 1
+            self.frame_times[request.path_qs].append(time.perf_counter() - start)
+        # The controller keeps a stream open, wait for the client to leave.
+        async for _msg in ws:
+            pass
+
+
+async def _record(upstream: str, output: Path, port: int) -> None:
+    recorder = Recorder(upstream)
+    host = await recorder.start(port)
+    print(f"Recording {upstream} through {host}, interrupt to save {output}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await recorder.stop()
+        recorder.recording.dump(output)
+
+
+def main() -> None:
+    """Record a controller session from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("upstream", help="controller host:port")
+    parser.add_argument("output", type=Path, help="recording file")
+    parser.add_argument("--port", type=int, default=9091)
+    args = parser.parse_args()
+    try:
+        asyncio.run(_record(args.upstream, args.output, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
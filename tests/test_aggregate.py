@@ -0,0 +1,105 @@
+"""Test the aggregate view of several controllers."""
+
+from datetime import timedelta
+
+from pytest_homeassistant_custom_component.common import (
+    MockConfigEntry,
+    async_fire_time_changed,
+)
+
+from homeassistant.config_entries import ConfigEntryState
+from homeassistant.core import HomeAssistant
+import homeassistant.util.dt as dt_util
+
+from custom_components.clash.const import CONF_AGGREGATE, DOMAIN, SCAN_INTERVAL
+
+HOSTS = ["192.168.0.1:9090", "192.168.0.2:9090"]
+
+
+def _mock_member(aioclient_mock, mock_controller, proxies, host, delay, total) -> None:
+    """Mock one controller reporting a node delay and traffic totals."""
+    url = mock_controller(
+        {
+            **proxies,
+            "Japan": {
+                **proxies["Japan"],
+                "history": [{"time": "2024-06-01T00:00:00.000Z", "delay": delay}],
+            },
+            "Taiwan": {
+                "name": "Taiwan",
+                "type": "Trojan",
+                "udp": True,
+                "history": [{"time": "2024-06-01T00:00:00.000Z", "delay": 300}],
+            },
+        },
+        host,
+    )
+    aioclient_mock.get(
+        f"{url}/connections",
+        json={"uploadTotal": total, "downloadTotal": total, "connections": []},
+    )
+
+
+async def test_aggregate(
+    hass: HomeAssistant, aioclient_mock, mock_controller, setup_entry, proxies
+) -> None:
+    """Test every controller is polled on the shared schedule."""
+    for host, delay in zip(HOSTS, (100, 200), strict=True):
+        _mock_member(aioclient_mock, mock_controller, proxies, host, delay, 0)
+        await setup_entry(host=host)
+    aggregate = MockConfigEntry(domain=DOMAIN, data={CONF_AGGREGATE: True})
+    aggregate.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(aggregate.entry_id)
+    await hass.async_block_till_done()
+
+    members = [
+        entry_data["coordinator"]
+        for entry_id, entry_data in hass.data[DOMAIN].items()
+        if entry_id != aggregate.entry_id
+    ]
+    assert all(member.update_interval is None for member in members)
+
+    fastest = hass.states.get("sensor.aggregate_fastest_node")
+    assert fastest.state == "Japan"
+    assert fastest.attributes["delays"] == {HOSTS[0]: 100, HOSTS[1]: 200}
+    assert hass.states.get("sensor.192_168_0_1_9090_health").attributes["healthy"]
+
+    # The second controller stops answering, the first keeps reporting traffic.
+    aioclient_mock.clear_requests()
+    _mock_member(
+        aioclient_mock, mock_controller, proxies, HOSTS[0], 100, 1024 * SCAN_INTERVAL
+    )
+    aioclient_mock.get(f"http://{HOSTS[1]}/proxies", exc=TimeoutError)
+    aioclient_mock.get(f"http://{HOSTS[1]}/connections", exc=TimeoutError)
+    async_fire_time_changed(
+        hass, dt_util.utcnow() + timedelta(seconds=SCAN_INTERVAL + 1)
+    )
+    await hass.async_block_till_done(wait_background_tasks=True)
+
+    health = hass.states.get("sensor.192_168_0_2_9090_health")
+    assert health.attributes["healthy"] is False
+    assert float(hass.states.get("sensor.aggregate_traffic_up").state) > 0
+
+    assert await hass.config_entries.async_unload(aggregate.entry_id)
+    assert all(member.update_interval is not None for member in members)
+
+
+async def test_aggregate_malformed_totals(
+    hass: HomeAssistant, aioclient_mock, mock_controller, setup_entry, proxies
+) -> None:
+    """Test a controller without traffic totals only fails its own health."""
+    _mock_member(aioclient_mock, mock_controller, proxies, HOSTS[0], 100, 0)
+    url = mock_controller(proxies, HOSTS[1])
+    aioclient_mock.get(f"{url}/connections", json={"connections": []})
+    for host in HOSTS:
+        await setup_entry(host=host)
+    aggregate = MockConfigEntry(domain=DOMAIN, data={CONF_AGGREGATE: True})
+    aggregate.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(aggregate.entry_id)
+    await hass.async_block_till_done()
+
+    assert aggregate.state is ConfigEntryState.LOADED
+    assert hass.states.get("sensor.192_168_0_1_9090_health").attributes["healthy"]
+    health = hass.states.get("sensor.192_168_0_2_9090_health")
+    assert health.attributes["healthy"] is False
+    assert health.attributes["error"] == "'uploadTotal'"
@@ -0,0 +1,123 @@
+"""Microbenchmark of the entity state write path."""
+
+from datetime import datetime
+import time
+
+import pytest
+
+from homeassistant.components.sensor import SensorDeviceClass, SensorStateClass
+from homeassistant.const import UnitOfTime
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.device_registry import DeviceInfo
+
+from custom_components.clash.const import DOMAIN
+from custom_components.clash.sensor import DelaySensor
+
+WRITES = 1000
+REPEAT = 5
+
+
+class LegacyDelaySensor(DelaySensor):
+    """Delay sensor evaluating its properties on every state write."""
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        if (proxy := self.coordinator.data.proxies.get(self.name_id)) is not None:
+            self._proxy = proxy
+        self.async_write_ha_state()
+
+    @property
+    def name(self) -> str:
+        return f"{self.name_id} legacy delay"
+
+    @property
+    def unique_id(self) -> str:
+        return f"{DOMAIN}-{self.host}-{self.name}"
+
+    @property
+    def native_value(self) -> int:
+        if self._proxy.get("history"):
+            return self._proxy["history"][0]["delay"]
+        return None
+
+    @property
+    def device_class(self) -> str | None:
+        return SensorDeviceClass.DURATION
+
+    @property
+    def device_info(self) -> DeviceInfo:
+        return DeviceInfo(
+            identifiers={(DOMAIN, self.host)},
+            configuration_url=f"http://{self.host}/ui",
+        )
+
+    @property
+    def native_unit_of_measurement(self) -> str:
+        return UnitOfTime.MILLISECONDS
+
+    @property
+    def state_class(self) -> str:
+        return SensorStateClass.MEASUREMENT
+
+    @property
+    def extra_state_attributes(self):
+        attrs = {}
+        attrs["type"] = self._proxy.get("type")
+        attrs["udp"] = self._proxy.get("udp")
+        if self._proxy.get("history"):
+            attrs["last_check"] = datetime.fromisoformat(
+                self._proxy["history"][0]["time"]
+            )
+        return attrs
+
+
+def _per_update(entity, views: list[dict]) -> float:
+    """Return the best seconds per coordinator update pushed to the entity."""
+    data = entity.coordinator.data
+    best = float("inf")
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        for i in range(WRITES):
+            data.proxies = {"Japan": views[i % len(views)]}
+            entity._handle_coordinator_update()
+        best = min(best, (time.perf_counter() - start) / WRITES)
+    return best
+
+
+@pytest.mark.benchmark
+async def test_write_cost(
+    hass: HomeAssistant, mock_controller, setup_entry, proxies
+) -> None:
+    """Compare the per-write cost with a sensor evaluating properties per write."""
+    mock_controller(proxies)
+    entry = await setup_entry(["Japan"])
+    coordinator = hass.data[DOMAIN][entry.entry_id]["coordinator"]
+    legacy = LegacyDelaySensor(coordinator, "Japan")
+    await hass.data["entity_components"]["sensor"].async_add_entities([legacy])
+    await hass.async_block_till_done()
+    current = next(
+        entity
+        for entity in hass.data["entity_components"]["sensor"].entities
+        if type(entity) is DelaySensor
+    )
+    japan = proxies["Japan"]
+    slower = {**japan, "history": [{**japan["history"][0], "delay": 240}]}
+
+    # Every update changes the proxy, so both write the state every time.
+    changing = [japan, slower]
+    legacy_cost = _per_update(legacy, changing)
+    current_cost = _per_update(current, changing)
+    # Polls returning the same proxy view, the common case between delay tests.
+    legacy_idle = _per_update(legacy, [japan])
+    current_idle = _per_update(current, [japan])
+    costs = (
+        f"per update, changing: legacy {legacy_cost * 1e6:.1f} us,"
+        f" current {current_cost * 1e6:.1f} us;"
+        f" unchanged: legacy {legacy_idle * 1e6:.1f} us,"
+        f" current {current_idle * 1e6:.1f} us"
+    )
+
+    assert hass.states.get("sensor.japan_delay").state == "120"
+    # Skipping the write is an order of magnitude cheaper on an idle machine,
+    # only the ordering is asserted so a loaded runner does not fail the test.
+    assert current_idle < legacy_idle, costs
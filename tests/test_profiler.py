@@ -0,0 +1,44 @@
+"""Test the Clash profiler."""
+
+from datetime import timedelta
+
+from pytest_homeassistant_custom_component.common import async_fire_time_changed
+
+from homeassistant.core import HomeAssistant
+import homeassistant.util.dt as dt_util
+
+from custom_components.clash.const import DATA_PROFILER, DOMAIN, SERVICE_PROFILE
+from custom_components.clash.coordinator import ClashCoordinator
+from custom_components.clash.diagnostics import async_get_config_entry_diagnostics
+
+
+async def test_profile(
+    hass: HomeAssistant, mock_controller, setup_entry, proxies
+) -> None:
+    """Test a profile run lands in the diagnostics and leaves no trace."""
+    mock_controller(proxies)
+    entry = await setup_entry(["Japan"])
+    original = ClashCoordinator.update_proxy
+
+    await hass.services.async_call(
+        DOMAIN, SERVICE_PROFILE, {"duration": 30, "interval": 1}, blocking=True
+    )
+    assert ClashCoordinator.update_proxy is not original
+    diagnostics = await async_get_config_entry_diagnostics(hass, entry)
+    assert diagnostics["profile"] == {"running": True, "report": None}
+
+    for seconds in (10, 20):
+        async_fire_time_changed(hass, dt_util.utcnow() + timedelta(seconds=seconds))
+        await hass.async_block_till_done(wait_background_tasks=True)
+    async_fire_time_changed(hass, dt_util.utcnow() + timedelta(seconds=31))
+    await hass.async_block_till_done()
+
+    assert not hass.data[DATA_PROFILER].running
+    assert ClashCoordinator.update_proxy is original
+
+    diagnostics = await async_get_config_entry_diagnostics(hass, entry)
+    assert diagnostics["coordinator"]["catalog_size"] == len(proxies)
+    report = diagnostics["profile"]["report"]
+    assert diagnostics["profile"]["running"] is False
+    assert report["sections"]["ClashCoordinator._async_update_data"]["calls"] >= 1
+    assert set(report) >= {"samples", "functions", "collapsed"}
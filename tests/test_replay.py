@@ -0,0 +1,222 @@
+"""Drive the integration with recorded controller traffic."""
+
+import asyncio
+from collections.abc import AsyncGenerator, Callable
+import json
+import math
+from pathlib import Path
+import time
+
+import pytest
+
+from homeassistant import config_entries
+from homeassistant.const import CONF_HOST
+from homeassistant.core import Event, HomeAssistant, callback
+from homeassistant.data_entry_flow import FlowResultType
+from homeassistant.helpers.event import async_track_state_change_event
+
+from custom_components.clash.const import CONF_TRAFFIC, DOMAIN
+
+from .replay import Recorder, Recording, ReplayServer
+
+FIXTURE = Path(__file__).parent / "fixtures" / "controller.jsonl"
+
+
+async def _wait_for(condition: Callable[[], bool], timeout: float = 10) -> None:
+    """Wait for replayed traffic to arrive, it does not block hass."""
+    start = time.perf_counter()
+    while not condition():
+        assert time.perf_counter() - start < timeout
+        await asyncio.sleep(0.005)
+
+
+@pytest.fixture(autouse=True)
+def enable_socket(socket_enabled: None) -> None:
+    """Let the replay server listen on the loopback interface."""
+
+
+@pytest.fixture
+def recording() -> Recording:
+    """Return the recorded controller session."""
+    return Recording.load(FIXTURE)
+
+
+@pytest.fixture
+async def controller(recording: Recording) -> AsyncGenerator[ReplayServer]:
+    """Serve the recording without delays."""
+    server = ReplayServer(recording, speed=math.inf)
+    await server.start()
+    yield server
+    await server.stop()
+
+
+async def test_coordinator(
+    hass: HomeAssistant, recording: Recording, setup_entry
+) -> None:
+    """Test polls follow the recorded controller state."""
+    # Five times the recorded latency dwarfs the scheduling noise of a runner.
+    controller = ReplayServer(recording, speed=0.2)
+    await controller.start()
+    try:
+        entry = await setup_entry(["Tokyo-01"], host=controller.host)
+        coordinator = hass.data[DOMAIN][entry.entry_id]["coordinator"]
+        assert len(coordinator.catalog) == 14
+        assert hass.states.get("sensor.tokyo_01_delay").state == "84"
+        assert hass.states.get("select.mode").state == "Rule"
+
+        served = len(controller.delays)
+        start, cpu_start = time.perf_counter(), time.process_time()
+        for _ in range(3):
+            await coordinator.async_refresh()
+        elapsed = time.perf_counter() - start
+        cpu = time.process_time() - cpu_start
+        await hass.async_block_till_done()
+        assert hass.states.get("sensor.tokyo_01_delay").state == "143"
+        await hass.config_entries.async_unload(entry.entry_id)
+    finally:
+        await controller.stop()
+
+    # Listened proxies are fetched one by one between bulk fetches.
+    assert controller.requests.count("GET /proxies/Tokyo-01") == 3
+    assert controller.requests.count("GET /proxies") == 2
+    # Requests are sent one after another and the integration works for less
+    # than the replayed controller latency it waits for. Process time is not
+    # stretched by other processes, unlike the elapsed time.
+    replayed = sum(controller.delays[served:])
+    assert elapsed >= replayed * 0.9
+    assert cpu < replayed
+
+
+async def _time_snapshots(
+    hass: HomeAssistant, setup_entry, recording: Recording, runs: int = 5
+) -> tuple[float, int]:
+    """Return the best process time of a snapshot fetch and its proxies.
+
+    The server runs in the same process, so the time includes serving the
+    body. Other processes of a loaded runner do not stretch it.
+    """
+    server = ReplayServer(recording, speed=math.inf)
+    await server.start()
+    try:
+        entry = await setup_entry(host=server.host)
+        coordinator = hass.data[DOMAIN][entry.entry_id]["coordinator"]
+        times = []
+        for _ in range(runs):
+            start = time.process_time()
+            data = await coordinator.async_fetch_snapshot()
+            times.append(time.process_time() - start)
+        await hass.config_entries.async_unload(entry.entry_id)
+    finally:
+        await server.stop()
+    return min(times), len(data.proxies)
+
+
+async def test_large_catalog(
+    hass: HomeAssistant, recording: Recording, setup_entry
+) -> None:
+    """Test bulk fetches of a large proxies body cost less than a round trip.
+
+    The recorded 14 nodes are the baseline, both catalogs are timed by their
+    best run.
+    """
+    large = Recording.load(FIXTURE)
+    body = json.loads(large.exchanges[0].body)
+    template = body["proxies"]["Tokyo-01"]
+    for i in range(2000):
+        body["proxies"][f"Node-{i}"] = {**template, "name": f"Node-{i}"}
+    large.exchanges[0].body = json.dumps(body)
+
+    small_time, small_proxies = await _time_snapshots(hass, setup_entry, recording)
+    large_time, large_proxies = await _time_snapshots(hass, setup_entry, large)
+
+    assert (small_proxies, large_proxies) == (14, 2014)
+    # 2000 more nodes cost less than two recorded round trips of a snapshot,
+    # a bulk fetch of the proxies and the mode.
+    latency = {exchange.key: exchange.latency for exchange in recording.exchanges}
+    snapshot_latency = latency["GET /proxies"] + latency["GET /configs"]
+    assert large_time - small_time < snapshot_latency * 2
+
+
+async def test_traffic(
+    hass: HomeAssistant, recording: Recording, controller: ReplayServer, setup_entry
+) -> None:
+    """Test every traffic frame of a burst reaches the state machine."""
+    frames = recording.streams["/traffic"]
+    states = []
+
+    @callback
+    def record_state(event: Event) -> None:
+        states.append(event.data["new_state"].state)
+
+    async_track_state_change_event(hass, ["sensor.traffic_down"], record_state)
+    entry = await setup_entry(host=controller.host, **{CONF_TRAFFIC: ["down"]})
+    last = str(json.loads(frames[-1][1])["down"] / 1024)
+    await _wait_for(lambda: states and states[-1] == last)
+    await hass.config_entries.async_unload(entry.entry_id)
+
+    # Quiet frames repeat the zero state and are not written again.
+    assert len(states) > len(frames) * 0.7
+
+
+async def test_traffic_timing(
+    hass: HomeAssistant, recording: Recording, setup_entry
+) -> None:
+    """Test streams replay with the recorded timing at the requested speed."""
+    # Keep the first burst only, it ends 1.45 seconds into the recording.
+    recording.streams["/traffic"] = recording.streams["/traffic"][:10]
+    server = ReplayServer(recording, speed=3)
+    await server.start()
+    try:
+        entry = await setup_entry(host=server.host, **{CONF_TRAFFIC: ["up"]})
+        await _wait_for(lambda: server.frames_sent["/traffic"] == 10)
+        await hass.config_entries.async_unload(entry.entry_id)
+    finally:
+        await server.stop()
+
+    # Frames are never sent ahead of their scaled offset, timed from the stream
+    # opening so the entry setup does not count. The upper bound only checks
+    # the burst replays faster than real time, loaded runners lag a lot.
+    offsets = [offset / 3 for offset, _ in recording.streams["/traffic"]]
+    sent = server.frame_times["/traffic"]
+    assert all(s >= o - 0.01 for s, o in zip(sent, offsets, strict=True))
+    assert sent == sorted(sent)
+    assert sent[-1] < 1.45
+
+
+async def test_config_flow(hass: HomeAssistant, controller: ReplayServer) -> None:
+    """Test the config flow validates against the controller."""
+    result = await hass.config_entries.flow.async_init(
+        DOMAIN, context={"source": config_entries.SOURCE_USER}
+    )
+    result = await hass.config_entries.flow.async_configure(
+        result["flow_id"], {CONF_HOST: controller.host}
+    )
+
+    assert result["type"] is FlowResultType.FORM
+    assert result["step_id"] == "entities"
+    assert controller.requests == ["GET /proxies"]
+
+
+async def test_record(
+    hass: HomeAssistant, controller: ReplayServer, setup_entry, tmp_path: Path
+) -> None:
+    """Test a session recorded through the recorder matches what was served."""
+    recorder = Recorder(controller.host)
+    host = await recorder.start()
+    entry = await setup_entry(["Tokyo-01"], host=host, **{CONF_TRAFFIC: ["up"]})
+    coordinator = hass.data[DOMAIN][entry.entry_id]["coordinator"]
+    await coordinator.async_refresh()
+    frames = controller.recording.streams["/traffic"]
+    await _wait_for(lambda: len(recorder.recording.streams["/traffic"]) == len(frames))
+    await hass.config_entries.async_unload(entry.entry_id)
+    await recorder.stop()
+
+    path = tmp_path / "session.jsonl.gz"
+    recorder.recording.dump(path)
+    recorded = Recording.load(path)
+    assert [exchange.key for exchange in recorded.exchanges] == controller.requests
+    assert {exchange.status for exchange in recorded.exchanges} == {200}
+    assert recorded.exchanges[0].body == controller.recording.exchanges[0].body
+    assert [data for _, data in recorded.streams["/traffic"]] == [
+        data for _, data in frames
+    ]
@@ -0,0 +1,243 @@
+"""Test the rule hit statistics."""
+
+from datetime import timedelta
+
+import pytest
+
+from pytest_homeassistant_custom_component.common import (
+    MockConfigEntry,
+    async_fire_time_changed,
+)
+
+from homeassistant.config_entries import RELOAD_AFTER_UPDATE_DELAY
+from homeassistant.const import CONF_HOST, STATE_UNAVAILABLE
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers import entity_registry as er
+
+from custom_components.clash.const import (
+    CATALOG_INTERVAL,
+    CONF_AGGREGATE,
+    DOMAIN,
+    SCAN_INTERVAL,
+)
+from custom_components.clash.diagnostics import async_get_config_entry_diagnostics
+from custom_components.clash.rules import RuleStats
+
+RULES = [
+    {"type": "DomainSuffix", "payload": "google.com", "proxy": "Proxy"},
+    {"type": "RuleSet", "payload": "reject", "proxy": "REJECT"},
+    {"type": "DomainKeyword", "payload": "unused", "proxy": "DIRECT"},
+    {"type": "Match", "payload": "", "proxy": "DIRECT"},
+]
+
+
+def _connection(id_, rule, payload, upload, download) -> dict:
+    return {
+        "id": id_,
+        "rule": rule,
+        "rulePayload": payload,
+        "upload": upload,
+        "download": download,
+    }
+
+
+async def _enable_rule_sensor(hass: HomeAssistant, entry, freezer) -> str:
+    """Enable the rule hit sensor of an entry and return its entity id."""
+    entity_registry = er.async_get(hass)
+    entity_id = entity_registry.async_get_entity_id(
+        "sensor", DOMAIN, f"clash-{entry.data[CONF_HOST]}-rules never hit"
+    )
+    entity_registry.async_update_entity(entity_id, disabled_by=None)
+    # The registry reloads the entry once the update settled.
+    freezer.tick(RELOAD_AFTER_UPDATE_DELAY + 1)
+    async_fire_time_changed(hass)
+    await hass.async_block_till_done(wait_background_tasks=True)
+    return entity_id
+
+
+async def _poll(hass: HomeAssistant, freezer) -> None:
+    freezer.tick(SCAN_INTERVAL + 1)
+    async_fire_time_changed(hass)
+    await hass.async_block_till_done(wait_background_tasks=True)
+
+
+def test_attribute(freezer) -> None:
+    """Test connections are counted once and their bytes incrementally."""
+    stats = RuleStats(timedelta(hours=1), CATALOG_INTERVAL)
+    assert stats.stale
+    stats.load(RULES)
+    assert not stats.stale
+
+    stats.attribute(
+        [
+            _connection("a", "DomainSuffix", "google.com", 100, 900),
+            _connection("b", "RuleSet", "reject", 0, 0),
+            _connection("c", "Match", "", 10, 10),
+        ]
+    )
+    stats.attribute(
+        [
+            _connection("a", "DomainSuffix", "google.com", 200, 1800),
+            _connection("d", "DomainSuffix", "google.com", 0, 0),
+        ]
+    )
+    summary = stats.summary()
+    google, match = summary["hottest"][0], summary["hottest"][1]
+    assert google["payload"] == "google.com"
+    assert (google["total_hits"], google["total_bytes"]) == (2, 2000)
+    assert match["type"] == "Match"
+    assert summary["providers"][0] == {
+        "provider": "reject",
+        "hits": 1.0,
+        "bytes": 0,
+        "total_hits": 1,
+        "total_bytes": 0,
+    }
+    assert summary["never_hit"] == [{"type": "DomainKeyword", "payload": "unused"}]
+
+    # Counts halve every half life, totals do not.
+    freezer.tick(timedelta(hours=1))
+    assert stats.summary()["hottest"][0]["hits"] == 1.0
+    assert stats.summary()["hottest"][0]["total_hits"] == 2
+
+    # A rule missing from the loaded rules means the config changed.
+    stats.attribute([_connection("e", "GeoIP", "CN", 0, 0)])
+    assert stats.stale
+    stats.load(RULES[:1])
+    assert stats.summary()["hottest"][0]["total_hits"] == 2
+    assert stats.summary()["rules"] == 1
+
+    # A connection without an id fails before anything is counted.
+    with pytest.raises(KeyError):
+        stats.attribute(
+            [
+                _connection("f", "DomainSuffix", "google.com", 0, 0),
+                {"rule": "DomainSuffix", "rulePayload": "google.com"},
+            ]
+        )
+    assert stats.summary()["hottest"][0]["total_hits"] == 2
+
+
+async def test_rule_hit_sensor(
+    hass: HomeAssistant, aioclient_mock, mock_controller, setup_entry, proxies, freezer
+) -> None:
+    """Test the disabled by default sensor follows connections once enabled."""
+    url = mock_controller(proxies)
+    aioclient_mock.get(f"{url}/rules", json={"rules": RULES})
+    aioclient_mock.get(
+        f"{url}/connections",
+        json={
+            "uploadTotal": 0,
+            "downloadTotal": 0,
+            "connections": [
+                _connection("a", "DomainSuffix", "google.com", 100, 900),
+                _connection("b", "RuleSet", "reject", 0, 0),
+            ],
+        },
+    )
+    entry = await setup_entry()
+    entity_registry = er.async_get(hass)
+    [rule_entry] = [
+        e
+        for e in er.async_entries_for_config_entry(entity_registry, entry.entry_id)
+        if e.unique_id.endswith("rules never hit")
+    ]
+    assert rule_entry.disabled
+    assert not any(call[1].path == "/rules" for call in aioclient_mock.mock_calls)
+
+    entity_id = await _enable_rule_sensor(hass, entry, freezer)
+    await _poll(hass, freezer)
+
+    state = hass.states.get(entity_id)
+    assert state.state == "2"
+    assert state.attributes["hottest"][0]["payload"] == "google.com"
+    assert state.attributes["providers"][0]["total_hits"] == 1
+
+    diagnostics = await async_get_config_entry_diagnostics(hass, entry)
+    assert diagnostics["rule_stats"]["never_hit"] == [
+        {"type": "DomainKeyword", "payload": "unused"},
+        {"type": "Match", "payload": ""},
+    ]
+    assert sum(call[1].path == "/rules" for call in aioclient_mock.mock_calls) == 1
+
+
+async def test_rule_stats_errors(
+    hass: HomeAssistant, aioclient_mock, mock_controller, setup_entry, proxies, freezer
+) -> None:
+    """Test malformed rules or connections never fail the coordinator."""
+    url = mock_controller(proxies)
+    aioclient_mock.get(f"{url}/rules", json={})
+    entry = await setup_entry(["Japan"])
+    entity_id = await _enable_rule_sensor(hass, entry, freezer)
+    coordinator = hass.data[DOMAIN][entry.entry_id]["coordinator"]
+    await _poll(hass, freezer)
+    assert coordinator.last_update_success
+    assert hass.states.get("sensor.japan_delay").state == "120"
+
+    connections = [_connection("a", "DomainSuffix", "google.com", 100, 900)]
+    aioclient_mock.clear_requests()
+    url = mock_controller(proxies)
+    aioclient_mock.get(f"{url}/rules", json={"rules": RULES})
+    aioclient_mock.get(
+        f"{url}/connections",
+        json={"connections": [*connections, {"rule": "Match", "rulePayload": ""}]},
+    )
+    await _poll(hass, freezer)
+    assert coordinator.last_update_success
+    assert hass.states.get("sensor.japan_delay").state != STATE_UNAVAILABLE
+
+    aioclient_mock.clear_requests()
+    url = mock_controller(proxies)
+    aioclient_mock.get(f"{url}/connections", json={"connections": connections})
+    await _poll(hass, freezer)
+    assert hass.states.get(entity_id).state == "3"
+
+    # The last summary is kept while the connections are malformed.
+    aioclient_mock.clear_requests()
+    url = mock_controller(proxies)
+    aioclient_mock.get(f"{url}/connections", json={"connections": [{}]})
+    await _poll(hass, freezer)
+    assert coordinator.last_update_success
+    assert hass.states.get(entity_id).state == "3"
+
+    # Failed updates make the sensor unavailable until the controller is back.
+    aioclient_mock.clear_requests()
+    url = mock_controller(proxies)
+    aioclient_mock.get(f"{url}/connections", exc=TimeoutError)
+    await _poll(hass, freezer)
+    assert not coordinator.last_update_success
+    assert hass.states.get(entity_id).state == STATE_UNAVAILABLE
+
+    aioclient_mock.clear_requests()
+    url = mock_controller(proxies)
+    aioclient_mock.get(f"{url}/connections", json={"connections": connections})
+    await _poll(hass, freezer)
+    assert hass.states.get(entity_id).state == "3"
+
+
+async def test_aggregate_connections(
+    hass: HomeAssistant, aioclient_mock, mock_controller, setup_entry, proxies, freezer
+) -> None:
+    """Test an aggregate poll sends one connections request per controller."""
+    url = mock_controller(proxies)
+    aioclient_mock.get(f"{url}/rules", json={"rules": RULES})
+    aioclient_mock.get(
+        f"{url}/connections",
+        json={
+            "uploadTotal": 0,
+            "downloadTotal": 0,
+            "connections": [_connection("a", "Match", "", 0, 0)],
+        },
+    )
+    entry = await setup_entry()
+    entity_id = await _enable_rule_sensor(hass, entry, freezer)
+    aggregate = MockConfigEntry(domain=DOMAIN, data={CONF_AGGREGATE: True})
+    aggregate.add_to_hass(hass)
+    assert await hass.config_entries.async_setup(aggregate.entry_id)
+    await hass.async_block_till_done()
+
+    calls = len(aioclient_mock.mock_calls)
+    await _poll(hass, freezer)
+    paths = [call[1].path for call in aioclient_mock.mock_calls[calls:]]
+    assert paths.count("/connections") == 1
+    assert hass.states.get(entity_id).state == "3"
@@ -0,0 +1,159 @@
+"""Test Clash sensors."""
+
+from pytest_homeassistant_custom_component.common import async_fire_time_changed
+
+from homeassistant.const import STATE_UNAVAILABLE
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers import entity_registry as er
+
+from custom_components.clash.const import (
+    CATALOG_INTERVAL,
+    CONF_PATTERN,
+    CONF_TRACK,
+    CONF_URLTEST,
+    DOMAIN,
+    LARGE_CATALOG,
+    SCAN_INTERVAL,
+)
+
+
+async def test_missing_proxy(
+    hass: HomeAssistant, mock_controller, setup_entry, proxies
+) -> None:
+    """Test selected proxies gone from the controller do not break setup."""
+    mock_controller(proxies)
+    await setup_entry(["Japan", "Gone"], ["Streaming", "Removed"])
+
+    assert hass.states.get("sensor.japan_delay").state == "120"
+    assert hass.states.get("sensor.gone_delay").state == STATE_UNAVAILABLE
+    assert hass.states.get("select.streaming_select").state == "Japan"
+    assert hass.states.get("select.removed_select").state == STATE_UNAVAILABLE
+
+
+async def test_large_catalog(
+    hass: HomeAssistant, mock_controller, setup_entry, proxies
+) -> None:
+    """Test large node selections are registered disabled."""
+    nodes = {
+        f"Node {i}": {**proxies["Japan"], "name": f"Node {i}"}
+        for i in range(LARGE_CATALOG + 1)
+    }
+    mock_controller(nodes)
+    entry = await setup_entry(nodes)
+
+    entity_registry = er.async_get(hass)
+    entries = [
+        e
+        for e in er.async_entries_for_config_entry(entity_registry, entry.entry_id)
+        if e.domain == "sensor" and e.entity_id.endswith("_delay")
+    ]
+    assert len(entries) == len(nodes)
+    assert all(e.disabled_by is er.RegistryEntryDisabler.INTEGRATION for e in entries)
+    assert hass.states.get("sensor.node_0_delay") is None
+
+
+async def test_reconcile(
+    hass: HomeAssistant, aioclient_mock, mock_controller, setup_entry, proxies, freezer
+) -> None:
+    """Test entities follow the controller proxies and the options in place."""
+    mock_controller(proxies)
+    entry = await setup_entry(**{CONF_TRACK: ["Streaming"]})
+    coordinator = hass.data[DOMAIN][entry.entry_id]["coordinator"]
+
+    assert hass.states.get("sensor.japan_delay").state == "120"
+    assert hass.states.get("sensor.taiwan_delay") is None
+
+    # The subscription adds a node to the tracked group.
+    taiwan = {**proxies["Japan"], "name": "Taiwan"}
+    aioclient_mock.clear_requests()
+    mock_controller({**proxies, "Taiwan": taiwan})
+    freezer.tick(CATALOG_INTERVAL)
+    async_fire_time_changed(hass)
+    await hass.async_block_till_done(wait_background_tasks=True)
+    assert hass.states.get("sensor.taiwan_delay").state == "120"
+
+    # Options apply without reloading the entry.
+    hass.config_entries.async_update_entry(
+        entry, options={**entry.options, CONF_TRACK: [], CONF_PATTERN: "^Tai"}
+    )
+    await hass.async_block_till_done()
+    assert hass.data[DOMAIN][entry.entry_id]["coordinator"] is coordinator
+    assert hass.states.get("sensor.japan_delay") is None
+    assert hass.states.get("sensor.taiwan_delay").state == "120"
+
+
+async def test_egress(
+    hass: HomeAssistant, aioclient_mock, mock_controller, setup_entry, proxies, freezer
+) -> None:
+    """Test egress sensors resolve their chain from data fetched anyway."""
+    proxies["Japan"]["history"].append(
+        {"time": "2024-06-01T00:05:00.000Z", "delay": 150}
+    )
+    url = mock_controller(proxies)
+    await setup_entry([], ["Streaming"])
+
+    # The egress shows the latest test, like the delay sensor of the node.
+    egress = hass.states.get("sensor.streaming_egress")
+    assert egress.state == "Japan"
+    assert egress.attributes["delay"] == 150
+
+    async def poll(interval=SCAN_INTERVAL) -> set[str]:
+        calls = len(aioclient_mock.mock_calls)
+        freezer.tick(interval)
+        async_fire_time_changed(hass)
+        await hass.async_block_till_done(wait_background_tasks=True)
+        return {call[1].path for call in aioclient_mock.mock_calls[calls:]}
+
+    # Only what the selector listens to is fetched, nothing for the egress.
+    assert await poll() == {"/proxies/Streaming", "/configs"}
+
+    # The selected group is fetched for the selector, the new node is only
+    # known after the next bulk fetch.
+    aioclient_mock.clear_requests()
+    mock_controller(
+        {
+            **proxies,
+            "Streaming": {**proxies["Streaming"], "now": "Taiwan"},
+            "Taiwan": {**proxies["Japan"], "name": "Taiwan"},
+        }
+    )
+    assert "/proxies" not in await poll()
+    egress = hass.states.get("sensor.streaming_egress")
+    assert egress.state == "Taiwan"
+    assert egress.attributes["delay"] is None
+    assert "/proxies" in await poll(CATALOG_INTERVAL)
+    assert hass.states.get("sensor.streaming_egress").attributes["delay"] == 150
+
+    # A failed refresh makes the egress unavailable with the other entities.
+    aioclient_mock.clear_requests()
+    for path in ("proxies", "proxies/Streaming", "configs"):
+        aioclient_mock.get(f"{url}/{path}", exc=TimeoutError)
+    await poll()
+    assert hass.states.get("select.streaming_select").state == STATE_UNAVAILABLE
+    assert hass.states.get("sensor.streaming_egress").state == STATE_UNAVAILABLE
+
+
+async def test_urltest(
+    hass: HomeAssistant, aioclient_mock, mock_controller, setup_entry, proxies, freezer
+) -> None:
+    """Test URLTest sensors show the selected node as a plain string state."""
+    proxies["Auto"] = {
+        "name": "Auto",
+        "type": "URLTest",
+        "now": "Japan",
+        "all": ["Japan", "Taiwan"],
+    }
+    mock_controller(proxies)
+    await setup_entry(**{CONF_URLTEST: ["Auto"]})
+
+    state = hass.states.get("sensor.auto_urltest")
+    assert state.state == "Japan"
+    assert state.attributes["all"] == ["Japan", "Taiwan"]
+    assert "state_class" not in state.attributes
+
+    aioclient_mock.clear_requests()
+    mock_controller({**proxies, "Auto": {**proxies["Auto"], "now": "Taiwan"}})
+    freezer.tick(SCAN_INTERVAL)
+    async_fire_time_changed(hass)
+    await hass.async_block_till_done(wait_background_tasks=True)
+    assert hass.states.get("sensor.auto_urltest").state == "Taiwan"
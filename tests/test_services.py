@@ -0,0 +1,269 @@
+"""Test Clash services."""
+
+import pytest
+from pytest_homeassistant_custom_component.common import async_fire_time_changed
+
+from homeassistant.const import STATE_UNAVAILABLE
+from homeassistant.core import HomeAssistant
+from homeassistant.exceptions import ServiceValidationError
+
+from custom_components.clash.const import (
+    CATALOG_INTERVAL,
+    DOMAIN,
+    SCAN_INTERVAL,
+    SERVICE_APPLY_PROFILE,
+    SERVICE_DNS_QUERY,
+    SERVICE_UPDATE_PROVIDERS,
+)
+
+PROXY_PROVIDERS = {
+    "default": {"name": "default", "vehicleType": "Compatible", "proxies": []},
+    "subscription": {
+        "name": "subscription",
+        "type": "Proxy",
+        "vehicleType": "HTTP",
+        "proxies": [{"name": "Japan", "type": "Shadowsocks", "udp": True}],
+        "updatedAt": "2024-06-01T08:00:00.123456789+08:00",
+        "subscriptionInfo": {
+            "Upload": 1024,
+            "Download": 2048,
+            "Total": 1073741824,
+            "Expire": 1735689600,
+        },
+    },
+}
+RULE_PROVIDERS = {
+    "reject": {
+        "name": "reject",
+        "type": "Rule",
+        "vehicleType": "HTTP",
+        "behavior": "Domain",
+        "ruleCount": 1000,
+        "updatedAt": "2024-06-01T08:00:00+08:00",
+    },
+}
+
+
+@pytest.fixture
+async def coordinator(hass: HomeAssistant, mock_controller, setup_entry, proxies):
+    """Set up a config entry against a mocked controller."""
+    mock_controller(
+        proxies,
+        proxy_providers=PROXY_PROVIDERS,
+        rule_providers=RULE_PROVIDERS,
+    )
+    entry = await setup_entry()
+    return hass.data[DOMAIN][entry.entry_id]["coordinator"]
+
+
+async def _poll(hass: HomeAssistant, freezer, interval) -> None:
+    freezer.tick(interval)
+    async_fire_time_changed(hass)
+    await hass.async_block_till_done(wait_background_tasks=True)
+
+
+async def test_apply_profile(hass: HomeAssistant, aioclient_mock, coordinator) -> None:
+    """Test selecting many groups reports per-group results."""
+    aioclient_mock.put(f"http://{coordinator.host}/proxies/Streaming", status=204)
+    aioclient_mock.put(f"http://{coordinator.host}/proxies/Work", status=500)
+    aioclient_mock.patch(f"http://{coordinator.host}/configs", status=204)
+
+    response = await hass.services.async_call(
+        DOMAIN,
+        SERVICE_APPLY_PROFILE,
+        {"groups": {"Streaming": "Taiwan", "Work": "Japan"}, "mode": "global"},
+        blocking=True,
+        return_response=True,
+    )
+
+    assert response["groups"]["Streaming"] == {"option": "Taiwan", "success": True}
+    assert response["groups"]["Work"]["success"] is False
+    assert response["mode"] == {"option": "Global", "success": True}
+
+
+async def test_apply_profile_invalid(
+    hass: HomeAssistant, aioclient_mock, coordinator
+) -> None:
+    """Test a profile is rejected before any request is sent."""
+    calls = aioclient_mock.call_count
+    with pytest.raises(ServiceValidationError):
+        await hass.services.async_call(
+            DOMAIN,
+            SERVICE_APPLY_PROFILE,
+            {"groups": {"Streaming": "Taiwan", "Japan": "Taiwan"}},
+            blocking=True,
+        )
+    assert aioclient_mock.call_count == calls
+
+
+async def test_update_providers(
+    hass: HomeAssistant, aioclient_mock, coordinator
+) -> None:
+    """Test providers are refreshed with per-provider results."""
+    aioclient_mock.put(
+        f"http://{coordinator.host}/providers/proxies/subscription", status=204
+    )
+    aioclient_mock.put(f"http://{coordinator.host}/providers/rules/reject", status=503)
+
+    response = await hass.services.async_call(
+        DOMAIN, SERVICE_UPDATE_PROVIDERS, {}, blocking=True, return_response=True
+    )
+
+    assert set(response["proxies"]) == {"subscription"}
+    assert response["proxies"]["subscription"]["success"] is True
+    assert response["proxies"]["subscription"]["elapsed_ms"] >= 0
+    assert response["rules"]["reject"]["success"] is False
+
+    assert hass.states.get("sensor.subscription_count").state == "1"
+    assert hass.states.get("sensor.subscription_usage").state == "3072"
+    assert hass.states.get("sensor.reject_count").state == "1000"
+    assert hass.states.get("sensor.reject_updated").state == (
+        "2024-06-01T00:00:00+00:00"
+    )
+
+
+async def test_provider_sensors(
+    hass: HomeAssistant, aioclient_mock, coordinator, mock_controller, proxies, freezer
+) -> None:
+    """Test providers are fetched with the catalog and their sensors reconciled."""
+    aioclient_mock.clear_requests()
+    mock_controller(proxies, proxy_providers=PROXY_PROVIDERS)
+    await _poll(hass, freezer, SCAN_INTERVAL + 1)
+    assert not any(
+        call[1].path.startswith("/providers/") for call in aioclient_mock.mock_calls
+    )
+    assert hass.states.get("sensor.reject_count").state == "1000"
+
+    # Removed providers are retired with the catalog refresh.
+    await _poll(hass, freezer, CATALOG_INTERVAL)
+    assert hass.states.get("sensor.reject_count") is None
+    assert hass.states.get("sensor.subscription_count").state == "1"
+
+    # And added ones are created.
+    aioclient_mock.clear_requests()
+    mock_controller(
+        proxies, proxy_providers=PROXY_PROVIDERS, rule_providers=RULE_PROVIDERS
+    )
+    await _poll(hass, freezer, CATALOG_INTERVAL)
+    assert hass.states.get("sensor.reject_count").state == "1000"
+
+    aioclient_mock.clear_requests()
+    for path in ("proxies", "providers/proxies", "providers/rules"):
+        aioclient_mock.get(f"http://{coordinator.host}/{path}", exc=TimeoutError)
+    await _poll(hass, freezer, CATALOG_INTERVAL)
+    assert not coordinator.last_update_success
+    assert hass.states.get("sensor.subscription_count").state == STATE_UNAVAILABLE
+    assert hass.states.get("sensor.reject_updated").state == STATE_UNAVAILABLE
+
+
+async def test_dns_query(
+    hass: HomeAssistant, aioclient_mock, coordinator, freezer
+) -> None:
+    """Test names resolve through the controller and are cached for their TTL."""
+    url = f"http://{coordinator.host}/dns/query"
+    aioclient_mock.get(
+        url,
+        params={"name": "github.com", "type": "A"},
+        json={
+            "Status": 0,
+            "Answer": [
+                {"name": "github.com.", "type": 1, "TTL": 1, "data": "198.18.0.7"}
+            ],
+        },
+    )
+    aioclient_mock.get(
+        url,
+        params={"name": "example.com", "type": "A"},
+        json={
+            "Status": 0,
+            "Answer": [
+                {"name": "example.com.", "type": 1, "TTL": 600, "data": "93.184.215.14"}
+            ],
+        },
+    )
+    aioclient_mock.get(url, params={"name": "example.com", "type": "AAAA"}, status=500)
+
+    async def query() -> dict:
+        return await hass.services.async_call(
+            DOMAIN,
+            SERVICE_DNS_QUERY,
+            {"names": ["GitHub.com.", "example.com"], "types": ["a", "AAAA"]},
+            blocking=True,
+            return_response=True,
+        )
+
+    aioclient_mock.get(url, params={"name": "github.com", "type": "AAAA"}, json={})
+
+    def lookups() -> int:
+        return sum(call[1].path == "/dns/query" for call in aioclient_mock.mock_calls)
+
+    response = await query()
+    github, example = response["names"]["github.com"], response["names"]["example.com"]
+    assert github["A"]["fake_ip"] is True
+    assert github["A"]["cached"] is False
+    assert github["AAAA"]["answers"] == []
+    assert example["A"]["fake_ip"] is False
+    assert example["A"]["answers"][0]["data"] == "93.184.215.14"
+    assert "error" in example["AAAA"]
+    assert lookups() == 4
+
+    # Served from the cache until the shortest TTL expires, errors are retried.
+    response = await query()
+    assert response["names"]["github.com"]["A"]["cached"] is True
+    assert response["names"]["example.com"]["A"]["cached"] is True
+    assert lookups() == 5
+
+    freezer.tick(2)
+    response = await query()
+    assert response["names"]["github.com"]["A"]["cached"] is False
+    assert response["names"]["example.com"]["A"]["ttl"] < 600
+
+
+async def test_dns_query_failures(
+    hass: HomeAssistant, aioclient_mock, coordinator
+) -> None:
+    """Test only NOERROR and NXDOMAIN are cached, malformed answers stay local."""
+    url = f"http://{coordinator.host}/dns/query"
+    aioclient_mock.get(
+        url, params={"name": "servfail.test", "type": "A"}, json={"Status": 2}
+    )
+    aioclient_mock.get(
+        url,
+        params={"name": "nxdomain.test", "type": "A"},
+        json={
+            "Status": 3,
+            "Authority": [{"name": "test.", "type": 6, "TTL": 60, "data": "soa"}],
+        },
+    )
+    aioclient_mock.get(
+        url,
+        params={"name": "malformed.test", "type": "A"},
+        json={"Status": 0, "Answer": [{"name": "malformed.test.", "type": 1}]},
+    )
+
+    async def query() -> dict:
+        response = await hass.services.async_call(
+            DOMAIN,
+            SERVICE_DNS_QUERY,
+            {
+                "names": ["servfail.test", "nxdomain.test", "malformed.test"],
+                "types": ["A"],
+            },
+            blocking=True,
+            return_response=True,
+        )
+        return {name: result["A"] for name, result in response["names"].items()}
+
+    def lookups() -> int:
+        return sum(call[1].path == "/dns/query" for call in aioclient_mock.mock_calls)
+
+    results = await query()
+    assert results["servfail.test"]["status"] == 2
+    assert results["nxdomain.test"]["ttl"] == 60
+    assert "error" in results["malformed.test"]
+    assert lookups() == 3
+
+    results = await query()
+    assert results["servfail.test"]["cached"] is False
+    assert results["nxdomain.test"]["cached"] is True
+    assert lookups() == 5
@@ -0,0 +1,51 @@
+"""Test the proxy group topology."""
+
+from custom_components.clash.topology import ProxyGraph
+
+
+def _group(name, now):
+    return {"name": name, "type": "Selector", "now": now, "history": []}
+
+
+def _node(name, delay):
+    return {
+        "name": name,
+        "type": "Shadowsocks",
+        "history": [{"time": "2024-06-01T00:00:00.000Z", "delay": delay}],
+    }
+
+
+def test_resolve_nested_groups() -> None:
+    """Test a selector is followed through a URLTest down to a node."""
+    graph = ProxyGraph()
+    graph.update(
+        {
+            "Streaming": _group("Streaming", "Auto"),
+            "Auto": {**_group("Auto", "Japan"), "type": "URLTest"},
+            "Japan": _node("Japan", 120),
+            "Taiwan": _node("Taiwan", 80),
+        }
+    )
+
+    egress = graph.resolve("Streaming")
+    assert egress.chain == ("Streaming", "Auto", "Japan")
+    assert egress.node == "Japan"
+    assert egress.delay == 120
+    assert not egress.cycle
+
+    # Only the changed group is fetched, cached chains through it are dropped.
+    graph.update({"Auto": {**_group("Auto", "Taiwan"), "type": "URLTest"}})
+    assert graph.resolve("Streaming").node == "Taiwan"
+    graph.update({"Taiwan": _node("Taiwan", 90)})
+    assert graph.resolve("Streaming").delay == 90
+
+
+def test_resolve_cycle() -> None:
+    """Test groups selecting each other do not resolve to a node."""
+    graph = ProxyGraph()
+    graph.update({"A": _group("A", "B"), "B": _group("B", "A")})
+
+    egress = graph.resolve("A")
+    assert egress.chain == ("A", "B")
+    assert egress.node is None
+    assert egress.cycle